@@ -0,0 +1,151 @@
+import json
+import os
+import sqlite3
+import threading
+from utils import derive_ltc_address
+
+class AddressIndex:
+    def __init__(self, path='addresses.json'):
+        self.path = path
+        self.next_index = 0
+        self.by_address = {}
+        # Allocation runs off the event loop, possibly two at once
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            data = json.load(f)
+        self.next_index = data['next_index']
+        self.by_address = {
+            address: int(channel_id)
+            for address, channel_id in data['addresses'].items()
+        }
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'next_index': self.next_index,
+                'addresses': self.by_address
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def allocate(self, channel_id, xpub):
+        # Indexes are never reused so an old address can't map to a new deal.
+        # Returns the address and its derivation index
+        with self.lock:
+            index = self.next_index
+            address = derive_ltc_address(xpub, index)
+            self.next_index += 1
+            self.by_address[address] = channel_id
+            self.save()
+        return address, index
+
+    def allocated(self):
+        return self.next_index
+
+    def lookup(self, address):
+        return self.by_address.get(address)
+
+    def release(self, address):
+        with self.lock:
+            if self.by_address.pop(address, None) is not None:
+                self.save()
+
+    def prune(self, channel_ids):
+        # Drops addresses of deals that are no longer open, returns them
+        with self.lock:
+            stale = [a for a, channel_id in self.by_address.items() if channel_id not in channel_ids]
+            for address in stale:
+                del self.by_address[address]
+            if stale:
+                self.save()
+        return stale
+
+class SharedAddressIndex:
+    """AddressIndex kept in SQLite so several worker processes can allocate."""
+
+    def __init__(self, path='deals.db', legacy_path='addresses.json'):
+        self.by_address = {}
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS addresses (
+                    address TEXT PRIMARY KEY,
+                    channel_id INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS address_counter (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    next_index INTEGER NOT NULL
+                );
+            """)
+        self.import_legacy(legacy_path)
+        self.load()
+
+    def import_legacy(self, legacy_path):
+        # Carry over a single-process index so its derivation indexes stay used
+        if not legacy_path or not os.path.exists(legacy_path):
+            return
+        legacy = AddressIndex(legacy_path)
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO address_counter (id, next_index) VALUES (0, ?)",
+                (legacy.next_index,)
+            )
+            if cursor.rowcount:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO addresses (address, channel_id) VALUES (?, ?)",
+                    legacy.by_address.items()
+                )
+
+    def allocate(self, channel_id, xpub):
+        # The address is derived before the write lock is taken, so other
+        # workers never wait on a derivation. If another worker took the
+        # index meanwhile, derive the next one and try again
+        while True:
+            index = self.allocated()
+            address = derive_ltc_address(xpub, index)
+            with self.lock, self.conn:
+                # BEGIN IMMEDIATE takes the write lock before the counter is read
+                self.conn.execute("BEGIN IMMEDIATE")
+                row = self.conn.execute(
+                    "SELECT next_index FROM address_counter WHERE id = 0"
+                ).fetchone()
+                if (row[0] if row else 0) != index:
+                    continue
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO address_counter (id, next_index) VALUES (0, ?)",
+                    (index + 1,)
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO addresses (address, channel_id) VALUES (?, ?)",
+                    (address, channel_id)
+                )
+            self.by_address[address] = channel_id
+            return address, index
+
+    def allocated(self):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT next_index FROM address_counter WHERE id = 0"
+            ).fetchone()
+        return row[0] if row else 0
+
+    def load(self):
+        # Lookups stay in memory; reload to see other workers' allocations
+        with self.lock:
+            rows = self.conn.execute("SELECT address, channel_id FROM addresses").fetchall()
+        self.by_address = dict(rows)
+
+    def lookup(self, address):
+        return self.by_address.get(address)
+
+    def release(self, address):
+        self.by_address.pop(address, None)
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM addresses WHERE address = ?", (address,))
@@ -0,0 +1,77 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from metrics import metrics
+
+# Lower values are served first
+PAYMENT = 0
+ONBOARDING = 1
+PRIORITY_NAMES = {PAYMENT: 'payment', ONBOARDING: 'onboarding'}
+
+class QueueFull(Exception):
+    pass
+
+class AdmissionGate:
+    def __init__(self, limit=10, max_waiting=200):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.active = 0
+        self.heap = []
+        self.waiting = Counter()
+        self.counter = itertools.count()
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self, priority=ONBOARDING, new=False):
+        # Holds one of `limit` slots for a burst of REST calls. New tickets
+        # are turned away once too many are waiting; work for tickets that
+        # were already admitted always queues
+        start = time.monotonic()
+        if self.active < self.limit and not self.waiting.total():
+            self.active += 1
+        else:
+            if new and self.waiting[priority] >= self.max_waiting:
+                self.rejected += 1
+                raise QueueFull(f"{self.waiting[priority]} tickets already waiting")
+            await self.wait(priority)
+        metrics.observe(f"admission wait {PRIORITY_NAMES[priority]}", time.monotonic() - start)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def wait(self, priority):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.heap, (priority, next(self.counter), future))
+        self.waiting[priority] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled
+                self.release()
+            else:
+                self.waiting[priority] -= 1
+            raise
+
+    def release(self):
+        # Hand the slot straight to the most urgent live waiter
+        while self.heap:
+            priority, _, future = heapq.heappop(self.heap)
+            if future.done():
+                continue
+            self.waiting[priority] -= 1
+            future.set_result(None)
+            return
+        self.active -= 1
+
+    def status(self):
+        return {
+            'active': self.active,
+            'limit': self.limit,
+            'waiting': {name: self.waiting[p] for p, name in PRIORITY_NAMES.items()},
+            'rejected': self.rejected
+        }
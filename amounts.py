@@ -0,0 +1,100 @@
+import sqlite3
+import threading
+from decimal import Decimal, ROUND_HALF_UP
+
+LITOSHIS_PER_LTC = 100_000_000
+
+def to_litoshis(ltc):
+    # Goes through str so floats and API strings round the same way
+    return int((Decimal(str(ltc)) * LITOSHIS_PER_LTC).to_integral_value(ROUND_HALF_UP))
+
+def format_ltc(litoshis):
+    return f"{Decimal(litoshis) / LITOSHIS_PER_LTC:.8f}"
+
+class AmountIndex:
+    def __init__(self, max_nudge=1000, stride=1, offset=0):
+        self.max_nudge = max_nudge
+        # Workers sharing an address each hand out amounts from their own
+        # residue class, so no two processes can pick the same amount
+        self.stride = stride
+        self.offset = offset
+        self.by_amount = {}
+
+    def allocate(self, address, channel_id, litoshis):
+        # Bump the amount a few litoshis until no other open deal on the
+        # address expects it, so a payment identifies exactly one deal
+        start = litoshis + (self.offset - litoshis) % self.stride
+        for candidate in range(start, litoshis + self.max_nudge, self.stride):
+            owner = self.by_amount.setdefault((address, candidate), channel_id)
+            if owner == channel_id:
+                return candidate
+        raise ValueError(f"No free amount within {self.max_nudge} litoshis of {litoshis}")
+
+    def claim(self, address, channel_id, litoshis):
+        # Re-registers an amount that was already handed out, e.g. on recovery
+        self.by_amount[(address, litoshis)] = channel_id
+
+    def lookup(self, address, litoshis):
+        return self.by_amount.get((address, litoshis))
+
+    def release(self, address, litoshis, channel_id):
+        if self.by_amount.get((address, litoshis)) == channel_id:
+            del self.by_amount[(address, litoshis)]
+
+class SharedAmountIndex(AmountIndex):
+    """AmountIndex whose claims also live in SQLite, so a worker can't hand
+    out an amount that a deal adopted by another worker still expects."""
+
+    def __init__(self, path='deals.db', max_nudge=1000, stride=1, offset=0):
+        super().__init__(max_nudge, stride, offset)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS amounts (
+                    address TEXT NOT NULL,
+                    amount_litoshis INTEGER NOT NULL,
+                    channel_id INTEGER NOT NULL,
+                    PRIMARY KEY (address, amount_litoshis)
+                )
+            """)
+
+    def allocate(self, address, channel_id, litoshis):
+        # by_amount only holds this worker's deals; the table is the source
+        # of truth for what is taken
+        start = litoshis + (self.offset - litoshis) % self.stride
+        with self.lock:
+            for candidate in range(start, litoshis + self.max_nudge, self.stride):
+                with self.conn:
+                    self.conn.execute(
+                        "INSERT OR IGNORE INTO amounts (address, amount_litoshis, channel_id) "
+                        "VALUES (?, ?, ?)",
+                        (address, candidate, channel_id)
+                    )
+                    owner = self.conn.execute(
+                        "SELECT channel_id FROM amounts WHERE address = ? AND amount_litoshis = ?",
+                        (address, candidate)
+                    ).fetchone()[0]
+                if owner == channel_id:
+                    self.by_amount[(address, candidate)] = channel_id
+                    return candidate
+        raise ValueError(f"No free amount within {self.max_nudge} litoshis of {litoshis}")
+
+    def claim(self, address, channel_id, litoshis):
+        super().claim(address, channel_id, litoshis)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO amounts (address, amount_litoshis, channel_id) "
+                "VALUES (?, ?, ?)",
+                (address, litoshis, channel_id)
+            )
+
+    def release(self, address, litoshis, channel_id):
+        super().release(address, litoshis, channel_id)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM amounts WHERE address = ? AND amount_litoshis = ? AND channel_id = ?",
+                (address, litoshis, channel_id)
+            )
@@ -0,0 +1,93 @@
+import asyncio
+import io
+import os
+import signal
+from collections import namedtuple
+from functools import lru_cache
+from amounts import format_ltc
+from utils import get_ltc_address, get_xpub, get_wif_key
+
+Assets = namedtuple('Assets', 'ltc_address xpub wif_key qr_image')
+
+ASSET_FILES = ('ltcaddy.txt', 'xpub.txt', 'wifkey.txt', 'qr.txt')
+
+def read_qr_path():
+    if not os.path.exists('qr.txt'):
+        return None
+    with open('qr.txt') as f:
+        return f.read().strip() or None
+
+def read_qr_image():
+    path = read_qr_path()
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+def load_assets():
+    return Assets(
+        ltc_address=get_ltc_address(),
+        xpub=get_xpub(),
+        wif_key=get_wif_key() if os.path.exists('wifkey.txt') else None,
+        qr_image=read_qr_image()
+    )
+
+def file_signature():
+    paths = [*ASSET_FILES, read_qr_path()]
+    return tuple(
+        (path, os.stat(path).st_mtime_ns) for path in paths
+        if path and os.path.exists(path)
+    )
+
+@lru_cache(maxsize=1024)
+def invoice_qr(address, litoshis):
+    # PNG of a payment URI for one invoice, or None without segno installed
+    try:
+        import segno
+    except ImportError:
+        return None
+    buffer = io.BytesIO()
+    segno.make(f"litecoin:{address}?amount={format_ltc(litoshis)}", error='m').save(
+        buffer, kind='png', scale=6, border=2
+    )
+    return buffer.getvalue()
+
+class AssetCache:
+    def __init__(self, watch_interval=5):
+        # Handlers read self.current, which is swapped whole on reload
+        self.watch_interval = watch_interval
+        self.signature = file_signature()
+        self.current = load_assets()
+        self.task = None
+
+    def reload(self):
+        try:
+            signature = file_signature()
+            self.current = load_assets()
+            self.signature = signature
+        except (OSError, ValueError) as e:
+            print(f"Asset reload failed, keeping the previous assets: {e}")
+            return
+        # The wallet keeps the key it was opened with until a restart
+        print("Reloaded address, key and QR assets")
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            if file_signature() != self.signature:
+                self.reload()
+
+    def start(self):
+        if self.task is not None:
+            return
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, self.reload)
+        except (AttributeError, NotImplementedError):
+            pass  # No SIGHUP on this platform, the file watch still works
+        if self.watch_interval:
+            self.task = asyncio.create_task(self.watch())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
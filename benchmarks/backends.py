@@ -0,0 +1,80 @@
+"""Payment lookup latency when the preferred chain provider degrades.
+
+Two local SoChain-compatible servers: the preferred one stalls or errors on
+a share of requests, the backup is steady. Compares calling the preferred
+provider alone with the hedging ChainRouter over both.
+
+Run from the repo root: python -m benchmarks.backends
+"""
+import asyncio
+import random
+import time
+from aiohttp import web
+from chain import ChainRouter
+from sochain import SoChainClient
+
+LOOKUPS = 300
+CONCURRENCY = 10
+
+async def start_fake(latency, slow_share=0.0, slow_latency=0.0, error_share=0.0):
+    async def received(request):
+        roll = random.random()
+        if roll < error_share:
+            return web.Response(status=503, text="rate limited")
+        delay = slow_latency if roll < error_share + slow_share else latency
+        await asyncio.sleep(delay)
+        return web.json_response({"status": "success", "data": {"txs": []}})
+
+    app = web.Application()
+    app.router.add_get('/get_tx_received/LTC/{address}', received)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+async def measure(chain):
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    latencies = []
+    failures = 0
+
+    async def lookup(i):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await chain.get_received_txs(f"Laddress{i}")
+            except Exception:
+                failures += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(lookup(i) for i in range(LOOKUPS)))
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+    return pick(0.5), pick(0.95), pick(0.99), failures
+
+async def main():
+    random.seed(1)
+    degraded, degraded_url = await start_fake(0.05, slow_share=0.1, slow_latency=3.0, error_share=0.05)
+    healthy, healthy_url = await start_fake(0.08)
+    try:
+        single = SoChainClient(base_url=degraded_url, name='degraded')
+        router = ChainRouter([
+            SoChainClient(base_url=degraded_url, name='degraded'),
+            SoChainClient(base_url=healthy_url, name='healthy')
+        ], failure_threshold=5, cooldown=5)
+        for label, chain in (("single provider", single), ("hedged router", router)):
+            p50, p95, p99, failures = await measure(chain)
+            print(
+                f"{label:>15} | p50 {p50:>7.1f} ms | p95 {p95:>7.1f} ms"
+                f" | p99 {p99:>7.1f} ms | failed {failures}/{LOOKUPS}"
+            )
+            await chain.close()
+    finally:
+        await degraded.cleanup()
+        await healthy.cleanup()
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""Message handling latency with many deals waiting on input.
+
+Compares discord.py's wait_for listeners, where every predicate runs for
+every message, against the channel-keyed MessageDispatcher.
+
+Run from the repo root: python -m benchmarks.dispatch
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+import discord
+from dispatcher import MessageDispatcher
+
+DEAL_COUNTS = (10, 100, 1000)
+MESSAGES = 2000
+
+def make_message(channel_id, author_id, content):
+    return SimpleNamespace(
+        channel=SimpleNamespace(id=channel_id),
+        author=SimpleNamespace(id=author_id),
+        content=content
+    )
+
+def wait_for_check(channel_id, sender_id):
+    # Same shape as the old ask_for_deal_amount predicate
+    def check(m):
+        try:
+            float(m.content)
+            return m.channel.id == channel_id and m.author.id == sender_id
+        except ValueError:
+            return False
+    return check
+
+def amount_parser(sender_id):
+    def parse(m):
+        if m.author.id != sender_id:
+            return None
+        try:
+            return float(m.content)
+        except ValueError:
+            return None
+    return parse
+
+def chatter(count):
+    # Chat from people who aren't the awaited sender, so waiters stay registered
+    return [
+        make_message(i % count, 10_000 + i, "12.50" if i % 2 else "hello")
+        for i in range(MESSAGES)
+    ]
+
+async def bench_wait_for(count):
+    async with discord.Client(intents=discord.Intents.none()) as client:
+        waiters = [
+            asyncio.ensure_future(client.wait_for('message', check=wait_for_check(i, i)))
+            for i in range(count)
+        ]
+        await asyncio.sleep(0)
+        messages = chatter(count)
+        start = time.perf_counter()
+        for message in messages:
+            client.dispatch('message', message)
+        elapsed = time.perf_counter() - start
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+    return elapsed / len(messages)
+
+async def bench_dispatcher(count):
+    dispatcher = MessageDispatcher(lambda channel_id: 'awaiting_amount')
+    waiters = [
+        dispatcher.wait(i, amount_parser(i), 'awaiting_amount') for i in range(count)
+    ]
+    messages = chatter(count)
+    start = time.perf_counter()
+    for message in messages:
+        dispatcher.dispatch(message)
+    elapsed = time.perf_counter() - start
+    for waiter in waiters:
+        waiter.cancel()
+    return elapsed / len(messages)
+
+async def main():
+    for count in DEAL_COUNTS:
+        wait_for = await bench_wait_for(count)
+        dispatch = await bench_dispatcher(count)
+        print(
+            f"{count:>5} waiting deals | wait_for {wait_for * 1e6:>9.2f} us/msg"
+            f" | dispatcher {dispatch * 1e6:>6.2f} us/msg"
+        )
+
+if __name__ == '__main__':
+    asyncio.run(main())
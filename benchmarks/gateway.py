@@ -0,0 +1,225 @@
+"""Memory and CPU cost of gateway traffic for a 50k-member guild.
+
+Replays synthetic gateway events through discord.py's state parsers for
+the full-intents setup and the low-footprint one. Events the intents don't
+cover are dropped before parsing, as Discord would never send them. Each
+mode runs in its own process so RSS is comparable.
+
+Run from the repo root: python -m benchmarks.gateway
+"""
+import asyncio
+import json
+import random
+import resource
+import subprocess
+import sys
+import time
+import discord
+from gateway import client_options
+
+MEMBERS = 50_000
+CHANNELS = 200
+EVENTS = 100_000
+GUILD_ID = 1_000_000
+BOT_ID = 999
+CHUNK_SIZE = 1000
+
+# Traffic mix of a busy guild; presences dominate
+EVENT_MIX = (
+    ('PRESENCE_UPDATE', 'presences', 0.6),
+    ('TYPING_START', 'guild_typing', 0.2),
+    ('GUILD_MEMBER_UPDATE', 'members', 0.05),
+    ('MESSAGE_CREATE', 'guild_messages', 0.15)
+)
+
+def user_payload(user_id):
+    return {
+        'id': str(user_id),
+        'username': f'user{user_id}',
+        'discriminator': '0',
+        'global_name': None,
+        'avatar': None
+    }
+
+def member_payload(user_id):
+    return {
+        'user': user_payload(user_id),
+        'roles': [],
+        'joined_at': '2024-01-01T00:00:00+00:00',
+        'deaf': False,
+        'mute': False,
+        'flags': 0
+    }
+
+def guild_payload():
+    return {
+        'id': str(GUILD_ID),
+        'name': 'bench',
+        'icon': None,
+        'owner_id': str(BOT_ID),
+        'large': True,
+        'member_count': MEMBERS + 1,
+        'roles': [{
+            'id': str(GUILD_ID), 'name': '@everyone', 'permissions': '0',
+            'position': 0, 'color': 0, 'hoist': False, 'managed': False,
+            'mentionable': False, 'flags': 0
+        }],
+        'channels': [
+            {'id': str(GUILD_ID + i), 'type': 0, 'name': f'ticket-{i}', 'position': i,
+             'permission_overwrites': []}
+            for i in range(1, CHANNELS + 1)
+        ],
+        'members': [member_payload(BOT_ID)],
+        'presences': [],
+        'features': [],
+        'emojis': [],
+        'stickers': [],
+        'threads': [],
+        'stage_instances': [],
+        'guild_scheduled_events': []
+    }
+
+def make_event(kind, rng):
+    user_id = rng.randrange(1, MEMBERS + 1) + BOT_ID
+    channel_id = str(GUILD_ID + rng.randrange(1, CHANNELS + 1))
+    if kind == 'PRESENCE_UPDATE':
+        return {
+            'user': {'id': str(user_id)},
+            'guild_id': str(GUILD_ID),
+            'status': rng.choice(('online', 'idle', 'dnd', 'offline')),
+            'activities': [],
+            'client_status': {'desktop': 'online'}
+        }
+    if kind == 'TYPING_START':
+        return {
+            'channel_id': channel_id,
+            'guild_id': str(GUILD_ID),
+            'user_id': str(user_id),
+            'timestamp': int(time.time()),
+            'member': member_payload(user_id)
+        }
+    if kind == 'GUILD_MEMBER_UPDATE':
+        data = member_payload(user_id)
+        data['guild_id'] = str(GUILD_ID)
+        data['nick'] = f'nick{rng.random():.4f}'
+        return data
+    return {
+        'id': str(rng.getrandbits(60)),
+        'channel_id': channel_id,
+        'guild_id': str(GUILD_ID),
+        'author': user_payload(user_id),
+        'member': member_payload(user_id),
+        'content': '12.50',
+        'timestamp': '2024-01-01T00:00:00+00:00',
+        'edited_timestamp': None,
+        'tts': False,
+        'mention_everyone': False,
+        'mentions': [],
+        'mention_roles': [],
+        'attachments': [],
+        'embeds': [],
+        'pinned': False,
+        'type': 0
+    }
+
+def traffic(seed=1):
+    rng = random.Random(seed)
+    kinds = [(kind, intent) for kind, intent, _ in EVENT_MIX]
+    weights = [weight for _, _, weight in EVENT_MIX]
+    return [
+        (kind, intent, make_event(kind, rng))
+        for kind, intent in rng.choices(kinds, weights, k=EVENTS)
+    ]
+
+class FakeGateway:
+    """Answers member chunk requests the way the real gateway does."""
+
+    open = False
+
+    def __init__(self, state):
+        self.state = state
+
+    async def request_chunks(self, guild_id, query=None, *, limit, user_ids=None, presences=False, nonce=None):
+        count = (MEMBERS + CHUNK_SIZE - 1) // CHUNK_SIZE
+        for index in range(count):
+            first = BOT_ID + 1 + index * CHUNK_SIZE
+            last = min(BOT_ID + MEMBERS, first + CHUNK_SIZE - 1)
+            self.state.parsers['GUILD_MEMBERS_CHUNK']({
+                'guild_id': str(guild_id),
+                'members': [member_payload(user_id) for user_id in range(first, last + 1)],
+                'chunk_index': index,
+                'chunk_count': count,
+                'nonce': nonce
+            })
+            await asyncio.sleep(0)
+
+def rss_mb():
+    # ru_maxrss is kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+async def run_mode(low_footprint):
+    options = client_options(low_footprint=low_footprint)
+    intents = options['intents']
+    events = traffic()
+    # Peak RSS before the client exists, so the replayed payloads don't count
+    baseline = rss_mb()
+
+    async with discord.Client(**options) as client:
+        state = client._connection
+        client.ws = FakeGateway(state)
+        state.user = discord.ClientUser(state=state, data=user_payload(BOT_ID))
+
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        state.parsers['GUILD_CREATE'](guild_payload())
+        guild = client.get_guild(GUILD_ID)
+        while state._guild_needs_chunking(guild):
+            await asyncio.sleep(0)
+        startup = time.perf_counter() - start
+
+        start = time.perf_counter()
+        delivered = 0
+        for kind, intent, data in events:
+            if not getattr(intents, intent):
+                continue
+            state.parsers[kind](data)
+            delivered += 1
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+
+        return {
+            'mode': 'low footprint' if low_footprint else 'all intents',
+            'delivered': delivered,
+            'members_cached': len(guild.members),
+            'rss_mb': rss_mb(),
+            'client_mb': rss_mb() - baseline,
+            'startup_s': startup,
+            'cpu_s': cpu,
+            'events_per_s': EVENTS / elapsed
+        }
+
+def main():
+    if len(sys.argv) > 1:
+        result = asyncio.run(run_mode(sys.argv[1] == 'slim'))
+        print(json.dumps(result))
+        return
+
+    print(f"{MEMBERS} members, {EVENTS} events offered")
+    print(
+        f"{'mode':<14} {'delivered':>9} {'members':>8} {'RSS MB':>7} {'client MB':>9} "
+        f"{'startup s':>9} {'CPU s':>6} {'offered/s':>10}"
+    )
+    for mode in ('all', 'slim'):
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.gateway', mode],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{result['mode']:<14} {result['delivered']:>9} {result['members_cached']:>8} "
+            f"{result['rss_mb']:>7.1f} {result['client_mb']:>9.1f} {result['startup_s']:>9.2f} {result['cpu_s']:>6.2f} "
+            f"{result['events_per_s']:>10.0f}"
+        )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Audit journal costs: record() on the handler path, batched flush
+throughput, and history lookups for one deal in a large journal.
+
+Run from the repo root: python -m benchmarks.journal
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from journal import Journal, history, replay
+
+EVENTS = ('payment_detected', 'payment_confirmed', 'released')
+
+def fill(journal, entries, deals, batch):
+    # Writes through write_batch in flush-sized batches, like the flush task
+    written = 0
+    record_ns = []
+    while written < entries:
+        for _ in range(min(batch, entries - written)):
+            channel_id = random.randrange(deals)
+            start = time.perf_counter_ns()
+            if random.random() < 0.5:
+                snapshot = json.dumps({'channel_id': channel_id, 'amount_litoshis': 12_345_678})
+                journal.record(channel_id, 'stage', stage='payment', deal=snapshot)
+            else:
+                journal.record(
+                    channel_id, random.choice(EVENTS),
+                    txid='ab' * 32, address='ltc1qexampleaddress', confirmations=1
+                )
+            record_ns.append(time.perf_counter_ns() - start)
+        written += len(journal.buffer)
+        journal.flush()
+    return record_ns
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=1_000_000)
+    parser.add_argument('--deals', type=int, default=100_000)
+    parser.add_argument('--batch', type=int, default=2000)
+    parser.add_argument('--lookups', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'journal.jsonl')
+        journal = Journal(path)
+        start = time.perf_counter()
+        record_ns = fill(journal, args.entries, args.deals, args.batch)
+        elapsed = time.perf_counter() - start
+        journal.close()
+        size = os.path.getsize(path)
+        print(f"{args.entries} entries, {size / 1e6:.0f} MB, {args.deals} deals")
+        print(f"record()           mean {statistics.mean(record_ns) / 1000:6.2f} us")
+        print(f"write + fsync      {args.entries / elapsed:8.0f} entries/s in batches of {args.batch}")
+
+        lookups = []
+        for _ in range(args.lookups):
+            start = time.perf_counter()
+            history(path, random.randrange(args.deals))
+            lookups.append((time.perf_counter() - start) * 1000)
+        lookups.sort()
+        print(
+            f"history(deal)      p50 {statistics.median(lookups):6.2f} ms  "
+            f"p99 {lookups[int(len(lookups) * 0.99) - 1]:6.2f} ms"
+        )
+
+        start = time.perf_counter()
+        deals = replay(path)
+        print(f"full replay        {len(deals)} deals in {time.perf_counter() - start:.1f} s")
+
+if __name__ == '__main__':
+    main()
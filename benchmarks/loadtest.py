@@ -0,0 +1,376 @@
+"""End-to-end load test of the deal flow with many concurrent tickets.
+
+Drives the real handlers in main.py, from on_guild_channel_create through
+role selection, both confirmations, the amount prompt, the invoice and the
+payment monitor up to the release prompt. Discord is replaced by in-memory
+channels and interactions, and SoChain and CoinGecko by local stubs with
+configurable latency running on their own thread, so the event loop lag
+measured is the bot's own.
+
+Run from the repo root: python -m benchmarks.loadtest --deals 300
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CATEGORY_ID = 42
+TIP = 2_000_000
+ids = itertools.count(10_000)
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.mention = f"<@{user_id}>"
+
+    def __eq__(self, other):
+        return getattr(other, 'id', None) == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __str__(self):
+        return f"user{self.id}"
+
+class FakeMessage:
+    def __init__(self, channel, author=None, content=None, embeds=(), view=None):
+        self.id = next(ids)
+        self.channel = channel
+        self.author = author
+        self.content = content
+        self.embeds = list(embeds)
+        self.view = view
+
+    def titles(self):
+        return [embed.title for embed in self.embeds]
+
+    async def edit(self, embed=None, embeds=None, view=...):
+        self.channel.rest_call()
+        self.embeds = [embed] if embed is not None else list(embeds or self.embeds)
+        if view is not ...:
+            self.view = view
+        self.channel.notify()
+        return self
+
+    async def delete(self):
+        self.channel.rest_call()
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def edit_message(self, embed=None, embeds=None, view=...):
+        await self.interaction.message.edit(embed=embed, embeds=embeds, view=view)
+
+    async def send_message(self, *args, **kwargs):
+        self.interaction.channel.rest_call()
+
+    async def send_modal(self, modal):
+        self.interaction.channel.rest_call()
+
+    async def defer(self, **kwargs):
+        self.interaction.channel.rest_call()
+
+class FakeInteraction:
+    def __init__(self, channel, user, message):
+        self.channel = channel
+        self.channel_id = channel.id
+        self.user = user
+        self.message = message
+        self.response = FakeResponse(self)
+
+class FakeChannel:
+    def __init__(self, rest_calls):
+        self.id = next(ids)
+        self.category_id = CATEGORY_ID
+        self.messages = []
+        self.updated = asyncio.Event()
+        self.rest_calls = rest_calls
+
+    def rest_call(self):
+        self.rest_calls['discord'] += 1
+
+    def notify(self):
+        self.updated.set()
+
+    async def send(self, content=None, *, embed=None, embeds=None, view=None, file=None):
+        self.rest_call()
+        message = FakeMessage(
+            self, content=content, embeds=[embed] if embed else embeds or (), view=view
+        )
+        self.messages.append(message)
+        self.notify()
+        return message
+
+    async def set_permissions(self, target, **permissions):
+        self.rest_call()
+
+    async def edit(self, **fields):
+        self.rest_call()
+
+    async def delete(self):
+        self.rest_call()
+
+    def get_partial_message(self, message_id):
+        return next(m for m in self.messages if m.id == message_id)
+
+    async def wait_for(self, predicate):
+        seen = 0
+        while True:
+            for message in self.messages[seen:]:
+                if predicate(message):
+                    return message
+            seen = len(self.messages)
+            self.updated.clear()
+            await self.updated.wait()
+
+class Stubs:
+    """SoChain and CoinGecko stand-ins served from a background thread."""
+
+    def __init__(self, chain_latency, rate_latency):
+        self.chain_latency = chain_latency
+        self.rate_latency = rate_latency
+        self.requests = Counter()
+        self.received = {}
+        self.ready = threading.Event()
+        self.loop = None
+        self.port = None
+
+    def pay(self, address, ltc):
+        self.received.setdefault(address, []).append(
+            {"txid": f"tx{next(ids)}", "value": ltc, "confirmations": 1}
+        )
+
+    async def get_info(self, request):
+        self.requests['sochain get_info'] += 1
+        await asyncio.sleep(self.chain_latency)
+        return web.json_response({"status": "success", "data": {"blocks": TIP}})
+
+    async def get_tx_received(self, request):
+        self.requests['sochain get_tx_received'] += 1
+        await asyncio.sleep(self.chain_latency)
+        txs = list(self.received.get(request.match_info['address'], ()))
+        after = request.match_info.get('after')
+        if after:
+            txids = [tx["txid"] for tx in txs]
+            txs = txs[txids.index(after) + 1:] if after in txids else txs
+        return web.json_response({"status": "success", "data": {"txs": txs[:100]}})
+
+    async def rate(self, request):
+        self.requests['coingecko price'] += 1
+        await asyncio.sleep(self.rate_latency)
+        return web.json_response({"litecoin": {"usd": 80.0}})
+
+    async def serve(self):
+        app = web.Application()
+        app.router.add_get('/get_info/LTC', self.get_info)
+        app.router.add_get('/get_tx_received/LTC/{address}', self.get_tx_received)
+        app.router.add_get('/get_tx_received/LTC/{address}/{after}', self.get_tx_received)
+        app.router.add_get('/price', self.rate)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.ready.set()
+        await asyncio.Event().wait()
+
+    def start(self):
+        def run():
+            self.loop = asyncio.new_event_loop()
+            self.loop.run_until_complete(self.serve())
+        threading.Thread(target=run, daemon=True).start()
+        self.ready.wait()
+        return f"http://127.0.0.1:{self.port}"
+
+def write_workdir(path, base_url, args):
+    config = {
+        'bot_token': 'unused',
+        'category_id': CATEGORY_ID,
+        'deal_timeout': 3600,
+        'chain_backends': [{'type': 'sochain', 'url': base_url}],
+        'rate_url': f"{base_url}/price",
+        'compact_messages': args.compact,
+        'metrics': args.metrics
+    }
+    with open(os.path.join(path, 'config.json'), 'w') as f:
+        json.dump(config, f)
+    with open(os.path.join(path, 'ltcaddy.txt'), 'w') as f:
+        f.write('LTCsharedaddress0000000000000000')
+    if args.per_deal_addresses:
+        # The wallet key has to be the account xprv behind the xpub
+        from bitcoinlib.keys import HDKey
+        account = HDKey(network='litecoin')
+        with open(os.path.join(path, 'xpub.txt'), 'w') as f:
+            f.write(account.wif_public())
+        with open(os.path.join(path, 'wifkey.txt'), 'w') as f:
+            f.write(account.wif_private())
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0
+
+async def sample_lag(lags, interval=0.01):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+def click(main, message, label, user):
+    # discord.py runs component callbacks as their own tasks
+    item = next(child for child in message.view.children if child.label == label)
+    interaction = FakeInteraction(message.channel, user, message)
+    return asyncio.create_task(item.callback(interaction))
+
+async def run_deal(main, stubs, rest_calls, think, timings):
+    channel = FakeChannel(rest_calls)
+    sender = FakeUser(next(ids))
+    receiver = FakeUser(next(ids))
+    main.fake_users[receiver.id] = receiver
+    main.fake_channels[channel.id] = channel
+    tasks = []
+
+    async def act():
+        await asyncio.sleep(think)
+
+    start = time.perf_counter()
+    tasks.append(asyncio.create_task(main.on_guild_channel_create(channel)))
+    await channel.wait_for(lambda m: m.content and 'Developer ID' in m.content)
+    await act()
+    await main.route_message(FakeMessage(channel, sender, str(receiver.id)))
+
+    roles = await channel.wait_for(lambda m: isinstance(m.view, main.RoleView))
+    await act()
+    await click(main, roles, 'Sender', sender)
+    await act()
+    tasks.append(click(main, roles, 'Receiver', receiver))
+
+    for confirm_type in ('roles', 'amount'):
+        confirm = await channel.wait_for(
+            lambda m: isinstance(m.view, main.ConfirmView) and m.view.confirm_type == confirm_type
+        )
+        await act()
+        await click(main, confirm, 'Correct', sender)
+        await act()
+        tasks.append(click(main, confirm, 'Correct', receiver))
+        if confirm_type == 'roles':
+            await channel.wait_for(lambda m: 'Deal Amount' in m.titles())
+            await act()
+            await main.route_message(FakeMessage(channel, sender, '25'))
+
+    await channel.wait_for(lambda m: isinstance(m.view, main.InvoiceButtons))
+    invoiced = time.perf_counter()
+    deal = main.active_deals[channel.id]
+    await act()
+    stubs.pay(deal['deposit_address'], main.format_ltc(deal['amount_litoshis']))
+
+    await channel.wait_for(lambda m: isinstance(m.view, main.ReleaseView))
+    done = time.perf_counter()
+    timings.append((invoiced - start, done - start))
+    await asyncio.gather(*tasks)
+
+async def run(args, stubs):
+    sys.path.insert(0, ROOT)
+    import main
+
+    # The fake Discord: channels and users come from the harness
+    main.fake_channels = {}
+    main.fake_users = {}
+    main.bot.get_channel = main.fake_channels.get
+    main.bot.get_user = main.fake_users.get
+
+    # No real wallet: deposit addresses aren't registered with bitcoinlib
+    async def register_deposit(index):
+        pass
+    main.wallet_service.register_deposit = register_deposit
+
+    rest_calls = Counter()
+    lags = []
+    timings = []
+    sampler = asyncio.create_task(sample_lag(lags))
+    await main.metrics.start()
+    main.scheduler.start()
+    main.deal_store.start()
+    main.monitor_payments.change_interval(seconds=args.poll_interval)
+    main.monitor_payments.start()
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    deals = [
+        asyncio.wait_for(run_deal(main, stubs, rest_calls, args.think, timings), args.timeout)
+        for _ in range(args.deals)
+    ]
+    results = await asyncio.gather(*deals, return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    failures = [r for r in results if isinstance(r, BaseException)]
+
+    sampler.cancel()
+    await main.metrics.stop()
+    main.monitor_payments.cancel()
+    main.scheduler.stop()
+    await main.chain.close()
+    await main.rates.close()
+    await main.deal_store.close()
+    main.leases.close()
+
+    invoice = [t[0] for t in timings]
+    total = [t[1] for t in timings]
+    print(f"{args.deals} deals in {elapsed:.2f}s, {len(failures)} failed")
+    if failures:
+        print(f"first failure: {failures[0]!r}")
+    for name, values in (('to invoice', invoice), ('to release prompt', total)):
+        print(
+            f"{name:<18} p50 {percentile(values, 0.5) * 1000:7.0f} ms  "
+            f"p95 {percentile(values, 0.95) * 1000:7.0f} ms  "
+            f"p99 {percentile(values, 0.99) * 1000:7.0f} ms  "
+            f"max {max(values, default=0) * 1000:7.0f} ms"
+        )
+    print(
+        f"event loop lag     p50 {percentile(lags, 0.5) * 1000:7.1f} ms  "
+        f"p99 {percentile(lags, 0.99) * 1000:7.1f} ms  "
+        f"max {max(lags, default=0) * 1000:7.1f} ms"
+    )
+    for name, count in sorted((stubs.requests + rest_calls).items()):
+        print(f"{name:<26} {count:>7} requests  {count / args.deals:6.2f} per deal")
+    # ru_maxrss is kilobytes on Linux
+    print(f"peak RSS growth {(rss_after - rss_before) / args.deals:.1f} KB per deal")
+    if args.metrics:
+        print("\nbuilt-in metrics")
+        for name, histogram in main.metrics.snapshot()['histograms'].items():
+            print(
+                f"{name:<42} {histogram['count']:>6}  p50 {histogram['p50_ms']:>7.1f} ms  "
+                f"p99 {histogram['p99_ms']:>7.1f} ms  max {histogram['max_ms']:>7.1f} ms"
+            )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--deals', type=int, default=200)
+    parser.add_argument('--chain-latency', type=float, default=0.05)
+    parser.add_argument('--rate-latency', type=float, default=0.1)
+    parser.add_argument('--think', type=float, default=0.0, help="seconds between user actions")
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    parser.add_argument('--timeout', type=float, default=120.0, help="per-deal limit")
+    parser.add_argument('--per-deal-addresses', action='store_true')
+    parser.add_argument('--compact', action='store_true', help="compact status messages")
+    parser.add_argument('--metrics', action='store_true', help="enable and print built-in metrics")
+    args = parser.parse_args()
+
+    stubs = Stubs(args.chain_latency, args.rate_latency)
+    base_url = stubs.start()
+    with tempfile.TemporaryDirectory() as workdir:
+        write_workdir(workdir, base_url, args)
+        os.chdir(workdir)
+        asyncio.run(run(args, stubs))
+
+if __name__ == '__main__':
+    main()
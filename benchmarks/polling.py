@@ -0,0 +1,110 @@
+"""Count upstream requests per monitor cycle for each chain backend.
+
+SoChain looks up one address per request, so per-deal addresses cost a
+request per open deal. Blockcypher takes up to 50 addresses per request,
+so per-deal mode costs one request per 50 open deals.
+
+Run from the repo root: python -m benchmarks.polling
+"""
+import asyncio
+import tempfile
+import os
+from aiohttp import web
+from sochain import SoChainClient
+from blockcypher import BlockcypherClient
+from addresses import AddressIndex
+from payments import poll_payments
+from cursors import TxCursors
+from amounts import AmountIndex
+
+DEAL_COUNTS = (10, 100, 1000)
+SHARED_ADDRESS = "LTCsharedaddress0000000000000000"
+
+async def start_stub(counter):
+    async def address(request):
+        counter['requests'] += 1
+        return web.json_response({
+            "status": "success",
+            "data": {
+                "txs": [
+                    {"txid": f"tx{i}", "value": f"{i / 1000:.8f}", "confirmations": 1}
+                    for i in range(1, 50)
+                ]
+            }
+        })
+
+    async def addrs(request):
+        # Blockcypher answers a ';'-joined batch with a list, one address
+        # with a bare object
+        counter['requests'] += 1
+        items = [
+            {
+                "address": address,
+                "txrefs": [
+                    {"tx_hash": f"tx{i}", "tx_input_n": -1, "value": i * 100_000,
+                     "confirmations": 1, "block_height": 2_500_000 - i}
+                    for i in range(49, 0, -1)
+                ],
+                "hasMore": False
+            }
+            for address in request.match_info['addresses'].split(';')
+        ]
+        return web.json_response(items if len(items) > 1 else items[0])
+
+    app = web.Application()
+    app.router.add_get('/get_tx_received/LTC/{address}', address)
+    app.router.add_get('/get_tx_received/LTC/{address}/{after_txid}', address)
+    app.router.add_get('/addrs/{addresses}', addrs)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+def make_deals(count, address_index, amount_index, per_deal_addresses):
+    deals = []
+    for channel_id in range(count):
+        address = SHARED_ADDRESS
+        amount = 100_000_000 + channel_id
+        if per_deal_addresses:
+            address = f"LTCdeal{channel_id:025d}"
+            address_index.by_address[address] = channel_id
+        else:
+            amount = amount_index.allocate(address, channel_id, amount)
+        deals.append({
+            'channel_id': channel_id,
+            'stage': 'payment',
+            'deposit_address': address,
+            'amount_litoshis': amount
+        })
+    return deals
+
+async def main():
+    counter = {'requests': 0}
+    runner, url = await start_stub(counter)
+    chains = [SoChainClient(base_url=url), BlockcypherClient(base_url=url)]
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for chain in chains:
+                for per_deal_addresses in (False, True):
+                    mode = "per-deal addresses" if per_deal_addresses else "shared address"
+                    for count in DEAL_COUNTS:
+                        name = f"{chain.name}-{mode}-{count}"
+                        address_index = AddressIndex(os.path.join(tmp, f"{name}.json"))
+                        amount_index = AmountIndex()
+                        deals = make_deals(count, address_index, amount_index, per_deal_addresses)
+                        counter['requests'] = 0
+                        cursors = TxCursors(os.path.join(tmp, f"{name}-cursors.json"))
+                        await poll_payments(chain, deals, address_index, amount_index, cursors)
+                        print(
+                            f"{chain.name:>11} | {mode:>18} | {count:>5} deals"
+                            f" | {counter['requests']:>5} requests/cycle"
+                        )
+    finally:
+        for chain in chains:
+            await chain.close()
+        await runner.cleanup()
+
+if __name__ == '__main__':
+    asyncio.run(main())
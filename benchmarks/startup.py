@@ -0,0 +1,104 @@
+"""Cold start cost: import time, time to ready and time to first interaction.
+
+Each run is a fresh interpreter importing main.py against local chain and
+rate stubs, with deals already in the store to recover. Ready is measured
+through setup_hook and on_ready, since there is no real gateway; the first
+interaction is a ticket channel being created, timed to the bot's first
+reply.
+
+Run from the repo root: python -m benchmarks.startup
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from types import SimpleNamespace
+from benchmarks.loadtest import ROOT, FakeChannel, Stubs, write_workdir
+
+async def child():
+    start = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+    heavy = sorted(name for name in ('bitcoinlib', 'sqlalchemy') if name in sys.modules)
+
+    main.bot.get_channel = lambda channel_id: None
+    main.bot.get_user = lambda user_id: None
+    await main.bot.setup_hook()
+    await main.on_ready()
+    ready = time.perf_counter()
+
+    channel = FakeChannel(Counter())
+    task = asyncio.create_task(main.on_guild_channel_create(channel))
+    await channel.wait_for(lambda message: True)
+    first_reply = time.perf_counter()
+
+    warm_up = getattr(main, 'warm_up_task', None)
+    if warm_up:
+        await warm_up
+    warm = time.perf_counter()
+    task.cancel()
+
+    print(json.dumps({
+        'import_ms': (imported - start) * 1000,
+        'ready_ms': (ready - start) * 1000,
+        'first_reply_ms': (first_reply - start) * 1000,
+        'warm_ms': (warm - start) * 1000,
+        'heavy_at_import': heavy
+    }))
+    os._exit(0)
+
+def seed_store(count):
+    from store import DealStore
+    store = DealStore('deals.db')
+    for i in range(count):
+        store.save({
+            'channel_id': 1_000 + i,
+            'stage': 'roles',
+            'start_time': {'datetime': time.time()},
+            'developer_id': i
+        })
+    store.flush()
+
+def main():
+    if sys.argv[1:] == ['child']:
+        return asyncio.run(child())
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--stored-deals', type=int, default=500)
+    args = parser.parse_args()
+
+    stubs = Stubs(chain_latency=0.05, rate_latency=0.1)
+    base_url = stubs.start()
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        options = SimpleNamespace(compact=False, metrics=False, per_deal_addresses=True)
+        write_workdir(workdir, base_url, options)
+        os.chdir(workdir)
+        seed_store(args.stored_deals)
+        for _ in range(args.runs):
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.startup', 'child'],
+                capture_output=True, text=True, check=True,
+                env={**os.environ, 'PYTHONPATH': ROOT}
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{args.runs} cold starts, {args.stored_deals} stored deals (median ms since import began)")
+    for key, label in (
+        ('import_ms', 'import main'),
+        ('ready_ms', 'ready'),
+        ('first_reply_ms', 'first interaction reply'),
+        ('warm_ms', 'warm-up finished')
+    ):
+        print(f"{label:<24} {statistics.median(r[key] for r in results):8.0f}")
+    print(f"heavy modules loaded by import: {', '.join(results[0]['heavy_at_import']) or 'none'}")
+
+if __name__ == '__main__':
+    main()
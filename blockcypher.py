@@ -0,0 +1,80 @@
+from chain import ChainError, HttpBackend
+
+BLOCKCYPHER_URL = "https://api.blockcypher.com/v1/ltc/main"
+
+class BlockcypherClient(HttpBackend):
+    def __init__(self, base_url=BLOCKCYPHER_URL, token=None, timeout=10, max_concurrency=3,
+                 name='blockcypher', batch_size=50):
+        super().__init__(name, base_url, timeout, max_concurrency)
+        self.token = token
+        self.batch_size = batch_size
+
+    def params(self, **params):
+        if self.token:
+            params['token'] = self.token
+        return params
+
+    async def get_json(self, path, **params):
+        data = await self.request_json('GET', path, params=self.params(limit=200, **params))
+        if isinstance(data, dict) and 'error' in data:
+            raise ChainError(f"{self.name} returned an error: {data['error']}")
+        return data
+
+    async def get_block_height(self):
+        data = await self.get_json("")
+        return data['height']
+
+    async def get_fee_rate(self):
+        # Chain info carries fee estimates in litoshis per kB
+        data = await self.get_json("")
+        return data['medium_fee_per_kb'] / 1000
+
+    async def collect(self, address, data, after_txid):
+        # Blockcypher lists newest first; walk back to the cursor and
+        # return oldest first like SoChain
+        txs = []
+        while True:
+            found = False
+            for ref in data.get('unconfirmed_txrefs', []) + data.get('txrefs', []):
+                if ref['tx_hash'] == after_txid:
+                    found = True
+                    break
+                if ref.get('tx_input_n') != -1:
+                    continue
+                txs.append({
+                    "txid": ref['tx_hash'],
+                    "value": f"{ref['value'] / 100_000_000:.8f}",
+                    "confirmations": ref.get('confirmations', 0)
+                })
+            if found or not data.get('hasMore') or not data.get('txrefs'):
+                break
+            before = min(ref['block_height'] for ref in data['txrefs'])
+            data = await self.get_json(f"/addrs/{address}", before=before)
+        txs.reverse()
+        return txs
+
+    async def get_received_txs(self, ltc_address, after_txid=None):
+        data = await self.get_json(f"/addrs/{ltc_address}")
+        return await self.collect(ltc_address, data, after_txid)
+
+    async def get_many_received_txs(self, after_txids):
+        # One request covers a whole batch of addresses
+        addresses = list(after_txids)
+        results = {}
+        for i in range(0, len(addresses), self.batch_size):
+            batch = addresses[i:i + self.batch_size]
+            data = await self.get_json(f"/addrs/{';'.join(batch)}")
+            for item in data if isinstance(data, list) else [data]:
+                address = item.get('address')
+                if address not in after_txids:
+                    continue
+                if 'error' in item:
+                    results[address] = ChainError(item['error'])
+                    continue
+                try:
+                    results[address] = await self.collect(address, item, after_txids[address])
+                except Exception as e:
+                    results[address] = e
+        for address in addresses:
+            results.setdefault(address, ChainError(f"{self.name} returned nothing for {address}"))
+        return results
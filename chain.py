@@ -0,0 +1,206 @@
+import asyncio
+import time
+from collections import deque
+import aiohttp
+from metrics import metrics
+
+class ChainError(Exception):
+    pass
+
+class HttpBackend:
+    def __init__(self, name, base_url, timeout=10, max_concurrency=8):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.session = None
+
+    def get_session(self):
+        # One pooled keep-alive session shared by every lookup
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_concurrency,
+                    keepalive_timeout=60
+                ),
+                timeout=self.timeout
+            )
+        return self.session
+
+    async def request_json(self, method, path, **kwargs):
+        session = self.get_session()
+        async with self.semaphore:
+            async with session.request(method, f"{self.base_url}{path}", **kwargs) as response:
+                response.raise_for_status()
+                try:
+                    return await response.json(content_type=None)
+                except ValueError as e:
+                    raise ChainError(f"{self.name} returned invalid JSON: {e}")
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+class ProviderHealth:
+    def __init__(self, failure_threshold=3, cooldown=30, default_p95=2.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.default_p95 = default_p95
+        self.latencies = deque(maxlen=100)
+        self.failures = 0
+        self.opened_at = None
+
+    def available(self):
+        # Open breakers let one trial call through once the cooldown is over
+        if self.opened_at is None:
+            return True
+        return time.monotonic() - self.opened_at >= self.cooldown
+
+    def record_success(self, latency):
+        self.latencies.append(latency)
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def p95(self):
+        if len(self.latencies) < 10:
+            return self.default_p95
+        ordered = sorted(self.latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+class ChainRouter:
+    def __init__(self, backends, failure_threshold=3, cooldown=30, max_hedge_delay=2.0):
+        self.backends = backends
+        self.max_hedge_delay = max_hedge_delay
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        # Per (provider, method), so a tip lookup's latency doesn't set the
+        # hedge delay for a thousand-address batch
+        self.health = {}
+
+    def health_of(self, backend, method):
+        key = (backend.name, method)
+        if key not in self.health:
+            self.health[key] = ProviderHealth(self.failure_threshold, self.cooldown, self.max_hedge_delay)
+        return self.health[key]
+
+    def candidates(self, method):
+        # Config order is the preference order; tripped providers go last
+        # so a request still goes somewhere when everything is down
+        available = [b for b in self.backends if self.health_of(b, method).available()]
+        tripped = [b for b in self.backends if b not in available]
+        return available + tripped
+
+    async def attempt(self, backend, method, args):
+        health = self.health_of(backend, method)
+        start = time.monotonic()
+        try:
+            result = await getattr(backend, method)(*args)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            health.record_failure()
+            metrics.observe(f"chain {backend.name} {method} failed", time.monotonic() - start)
+            raise
+        health.record_success(time.monotonic() - start)
+        metrics.observe(f"chain {backend.name} {method}", time.monotonic() - start)
+        return result
+
+    async def call(self, method, *args):
+        _, result = await self.route(method, args)
+        return result
+
+    async def route(self, method, args, exclude=()):
+        # Returns the provider that answered and its result. Providers
+        # without the method, e.g. fee estimates on SoChain, are skipped
+        queue = [
+            backend for backend in self.candidates(method)
+            if hasattr(backend, method) and backend.name not in exclude
+        ]
+        if not queue:
+            raise ChainError(f"No chain provider supports {method}")
+        running = {}
+        errors = []
+        try:
+            while queue or running:
+                if queue and not running:
+                    latest = queue.pop(0)
+                    running[asyncio.ensure_future(self.attempt(latest, method, args))] = latest
+
+                # Hedge with the next provider if the latest one is slower than its p95
+                hedge_delay = None
+                if queue:
+                    hedge_delay = min(self.health_of(latest, method).p95(), self.max_hedge_delay)
+                done, _ = await asyncio.wait(
+                    running,
+                    timeout=hedge_delay,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    latest = queue.pop(0)
+                    running[asyncio.ensure_future(self.attempt(latest, method, args))] = latest
+                    continue
+
+                for task in done:
+                    backend = running.pop(task)
+                    if task.exception() is None:
+                        return backend, task.result()
+                    errors.append(f"{backend.name}: {task.exception()!r}")
+        finally:
+            for task in running:
+                task.cancel()
+        raise ChainError(f"All chain providers failed ({'; '.join(errors)})")
+
+    async def get_block_height(self):
+        with metrics.timer('chain get_block_height'):
+            return await self.call('get_block_height')
+
+    async def get_received_txs(self, ltc_address, after_txid=None):
+        with metrics.timer('chain get_received_txs'):
+            return await self.call('get_received_txs', ltc_address, after_txid)
+
+    async def get_many_received_txs(self, after_txids):
+        # Addresses a provider failed on, e.g. when it rate limits part of a
+        # batch, are asked of the next provider
+        with metrics.timer('chain get_many_received_txs'):
+            results = {}
+            pending = after_txids
+            tried = set()
+            while pending:
+                try:
+                    backend, batch = await self.route('get_many_received_txs', (pending,), tried)
+                except ChainError:
+                    if not results:
+                        raise
+                    break
+                tried.add(backend.name)
+                results.update(batch)
+                pending = {
+                    address: after_txids[address]
+                    for address, txs in batch.items() if isinstance(txs, Exception)
+                }
+            return results
+
+    async def get_fee_rate(self):
+        # Litoshis per virtual byte
+        with metrics.timer('chain get_fee_rate'):
+            return await self.call('get_fee_rate')
+
+    def status(self):
+        return {
+            f"{name} {method}": {
+                'available': health.available(),
+                'failures': health.failures,
+                'p95': health.p95()
+            }
+            for (name, method), health in self.health.items()
+        }
+
+    async def close(self):
+        for backend in self.backends:
+            await backend.close()
@@ -0,0 +1,30 @@
+DEFAULT_POLICY = [{'confirmations': 1}]
+
+class ConfirmationTracker:
+    def __init__(self, policy=None):
+        # Tiers are checked in order; the first whose max_usd covers the
+        # deal wins and a tier without max_usd matches everything
+        self.policy = policy or DEFAULT_POLICY
+        self.tip = None
+
+    def required(self, amount_usd):
+        for tier in self.policy:
+            if 'max_usd' not in tier or amount_usd <= tier['max_usd']:
+                return tier['confirmations']
+        return self.policy[-1]['confirmations']
+
+    def update_tip(self, height):
+        if height == self.tip:
+            return False
+        self.tip = height
+        return True
+
+    def observe(self, deal, confirmations):
+        # Once a tx is in a block its count follows from the tip alone
+        if confirmations > 0 and self.tip is not None:
+            deal['tx_height'] = self.tip - confirmations + 1
+
+    def confirmations(self, deal):
+        if deal.get('tx_height') is None or self.tip is None:
+            return 0
+        return max(0, self.tip - deal['tx_height'] + 1)
@@ -0,0 +1,84 @@
+import json
+import os
+from collections import deque
+
+MAX_SEEN = 1000
+
+class TxCursors:
+    def __init__(self, path='cursors.json'):
+        self.path = path
+        self.last_txid = {}
+        self.seen = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            data = json.load(f)
+        for address, cursor in data.items():
+            self.last_txid[address] = cursor['last_txid']
+            self.seen[address] = deque(cursor['seen'], maxlen=MAX_SEEN)
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                address: {
+                    'last_txid': self.last_txid.get(address),
+                    'seen': list(self.seen.get(address, ()))
+                }
+                for address in set(self.last_txid) | set(self.seen)
+            }, f)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def after(self, address):
+        return self.last_txid.get(address)
+
+    def known(self, address):
+        return address in self.seen
+
+    def seed(self, address, txs):
+        # A new cursor starts past the address's history, which is only
+        # marked seen and never handed out for matching
+        self.seen[address] = deque((tx["txid"] for tx in txs), maxlen=MAX_SEEN)
+        for tx in txs:
+            if tx["confirmations"] > 0:
+                self.last_txid[address] = tx["txid"]
+        self.dirty = True
+
+    def advance(self, address, txs):
+        # Returns only txs not handed out before. The cursor stops at the
+        # last confirmed tx so unconfirmed ones are fetched again next poll
+        seen = self.seen.setdefault(address, deque(maxlen=MAX_SEEN))
+        seen_set = set(seen)
+        new_txs = []
+        for tx in txs:
+            if tx["confirmations"] > 0:
+                self.last_txid[address] = tx["txid"]
+                self.dirty = True
+            if tx["txid"] in seen_set:
+                continue
+            seen.append(tx["txid"])
+            seen_set.add(tx["txid"])
+            new_txs.append(tx)
+            self.dirty = True
+        return new_txs
+
+    def is_seen(self, address, txid):
+        return txid in self.seen.get(address, ())
+
+    def mark_seen(self, address, txid):
+        seen = self.seen.setdefault(address, deque(maxlen=MAX_SEEN))
+        if txid not in seen:
+            seen.append(txid)
+            self.dirty = True
+
+    def forget(self, address):
+        self.last_txid.pop(address, None)
+        if self.seen.pop(address, None) is not None:
+            self.dirty = True
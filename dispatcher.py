@@ -0,0 +1,46 @@
+import asyncio
+
+class MessageDispatcher:
+    def __init__(self, stage_of):
+        self.stage_of = stage_of
+        self.waiters = {}
+
+    def wait(self, channel_id, parse, stage=None):
+        # One waiter per channel; a new prompt replaces the old one
+        self.discard(channel_id)
+        future = asyncio.get_running_loop().create_future()
+        self.waiters[channel_id] = (stage, parse, future)
+        return future
+
+    def discard(self, channel_id, future=None):
+        waiter = self.waiters.get(channel_id)
+        if waiter is None or (future is not None and waiter[2] is not future):
+            return
+        del self.waiters[channel_id]
+        if not waiter[2].done():
+            waiter[2].cancel()
+
+    def expire(self, channel_id):
+        waiter = self.waiters.pop(channel_id, None)
+        if waiter and not waiter[2].done():
+            waiter[2].set_result(None)
+
+    def dispatch(self, message):
+        waiter = self.waiters.get(message.channel.id)
+        if waiter is None:
+            return False
+
+        stage, parse, future = waiter
+        if future.done():
+            del self.waiters[message.channel.id]
+            return False
+        if stage is not None and self.stage_of(message.channel.id) != stage:
+            return False
+
+        # Only the parser for this channel's prompt ever sees the message
+        result = parse(message)
+        if result is None:
+            return False
+        del self.waiters[message.channel.id]
+        future.set_result(result)
+        return True
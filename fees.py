@@ -0,0 +1,46 @@
+import asyncio
+import time
+from chain import ChainError
+
+# Litoshis per virtual byte, used until a provider gives an estimate
+DEFAULT_FEE_RATE = 10
+
+class FeeEstimator:
+    def __init__(self, chain, ttl=300, stale_ttl=3600, default_rate=DEFAULT_FEE_RATE, min_rate=1):
+        # Rates are litoshis per virtual byte
+        self.chain = chain
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.default_rate = default_rate
+        self.min_rate = min_rate
+        self.rate = None
+        self.fetched_at = 0
+        self.inflight = None
+
+    def current(self):
+        # What a payout pays right now; never waits on a provider
+        if self.rate is None or time.monotonic() - self.fetched_at >= self.stale_ttl:
+            return self.default_rate
+        return self.rate
+
+    async def get_rate(self):
+        # A stale rate is returned at once while a refresh runs behind it,
+        # so a payout only ever waits for the very first estimate
+        age = time.monotonic() - self.fetched_at
+        if self.rate is not None and age < self.ttl:
+            return self.rate
+        if self.inflight is None:
+            self.inflight = asyncio.ensure_future(self.refresh())
+        if self.rate is None:
+            await asyncio.shield(self.inflight)
+        return self.current()
+
+    async def refresh(self):
+        try:
+            rate = await self.chain.get_fee_rate()
+            self.rate = max(rate, self.min_rate)
+            self.fetched_at = time.monotonic()
+        except ChainError as e:
+            print(f"Fee estimate failed, using {self.current()} litoshis/vB: {e}")
+        finally:
+            self.inflight = None
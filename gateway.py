@@ -0,0 +1,21 @@
+import discord
+
+def slim_intents():
+    # The deal flow only needs ticket channel creation and the messages typed
+    # in tickets; interactions are delivered regardless of intents
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.message_content = True
+    return intents
+
+def client_options(low_footprint=False, max_messages=1000):
+    if not low_footprint:
+        return {'intents': discord.Intents.all(), 'max_messages': max_messages}
+    # No member cache or startup chunking, users are fetched when a deal needs them
+    return {
+        'intents': slim_intents(),
+        'member_cache_flags': discord.MemberCacheFlags.none(),
+        'chunk_guilds_at_startup': False,
+        'max_messages': max_messages
+    }
@@ -0,0 +1,248 @@
+"""Append-only audit journal of deal events.
+
+Each line is one JSON entry: when it happened, the deal's channel id, the
+event name and its fields. Handlers only append to an in-memory buffer; a
+background task writes and fsyncs it in batches. A SQLite sidecar maps each
+deal to the byte offsets of its entries, so one deal's history is read
+without scanning the whole file.
+
+Replay from the repo root:
+    python -m journal show <channel_id>
+    python -m journal rebuild [--out deals.json]
+    python -m journal reindex
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from metrics import metrics
+
+class Journal:
+    def __init__(self, path='journal.jsonl', flush_interval=0.2):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.stages = {}
+        self.flush_task = None
+        self.file = open(path, 'ab')
+        self.index = sqlite3.connect(f"{path}.idx", check_same_thread=False)
+        # The index can always be rebuilt from the journal, so it skips fsyncs
+        self.index.execute("PRAGMA journal_mode=WAL")
+        self.index.execute("PRAGMA synchronous=OFF")
+        self.index.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                channel_id INTEGER NOT NULL,
+                offset INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_channel_id ON entries (channel_id, offset);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+        self.catch_up()
+
+    def record(self, channel_id, event, **fields):
+        # Never touches the disk, the flush task does
+        self.buffer.append((time.time(), channel_id, event, fields))
+
+    def record_stage(self, deal, snapshot):
+        # Called on every store save; only stage changes are journaled, with
+        # the serialized deal so replay can rebuild it
+        channel_id = deal['channel_id']
+        if self.stages.get(channel_id) != deal['stage']:
+            self.stages[channel_id] = deal['stage']
+            self.record(channel_id, 'stage', stage=deal['stage'], deal=snapshot)
+
+    def record_closed(self, channel_id):
+        self.stages.pop(channel_id, None)
+        self.record(channel_id, 'closed')
+
+    def indexed_to(self):
+        row = self.index.execute("SELECT value FROM meta WHERE key = 'indexed_to'").fetchone()
+        return row[0] if row else 0
+
+    def catch_up(self):
+        # Index whatever the journal has past the index, e.g. after a crash
+        # between the journal fsync and the index commit. A torn final line
+        # from a crash mid-write is cut off
+        with self.lock:
+            offset = self.indexed_to()
+            rows = []
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    rows.append((json.loads(line)['channel_id'], offset))
+                    offset += len(line)
+            if offset < os.path.getsize(self.path):
+                print(f"Truncating torn journal entry at byte {offset}")
+                self.file.truncate(offset)
+            self.commit_index(rows, offset)
+
+    def commit_index(self, rows, offset):
+        with self.index:
+            self.index.executemany("INSERT INTO entries (channel_id, offset) VALUES (?, ?)", rows)
+            self.index.execute(
+                "INSERT INTO meta (key, value) VALUES ('indexed_to', ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                (offset,)
+            )
+
+    def write_batch(self, batch):
+        lines = []
+        for ts, channel_id, event, fields in batch:
+            snapshot = fields.get('deal')
+            line = json.dumps({
+                'ts': ts, 'channel_id': channel_id, 'event': event,
+                **{key: value for key, value in fields.items() if key != 'deal'}
+            })
+            if snapshot is not None:
+                # Already serialized by the store, spliced in as is
+                line = f'{line[:-1]}, "deal": {snapshot}}}'
+            lines.append(line.encode() + b'\n')
+        with self.lock:
+            offset = self.file.seek(0, os.SEEK_END)
+            rows = []
+            for (_, channel_id, _, _), line in zip(batch, lines):
+                rows.append((channel_id, offset))
+                offset += len(line)
+            self.file.write(b''.join(lines))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.commit_index(rows, offset)
+
+    def flush(self):
+        if self.buffer:
+            batch, self.buffer = self.buffer, []
+            self.write_batch(batch)
+
+    async def flush_async(self):
+        if not self.buffer:
+            return
+        batch, self.buffer = self.buffer, []
+        try:
+            with metrics.timer('journal flush'):
+                await asyncio.to_thread(self.write_batch, batch)
+        except OSError:
+            # Keep the entries, in order, ahead of anything recorded since
+            self.buffer[:0] = batch
+            raise
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_async()
+            except OSError as e:
+                print(f"Journal flush failed: {e}")
+
+    def start(self):
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.run())
+
+    def close(self):
+        if self.flush_task:
+            self.flush_task.cancel()
+            self.flush_task = None
+        self.flush()
+        with self.lock:
+            self.file.close()
+            self.index.close()
+
+def read_entries(path, offsets=None):
+    with open(path, 'rb') as f:
+        if offsets is None:
+            for line in f:
+                if line.endswith(b'\n'):
+                    yield json.loads(line)
+            return
+        for offset in offsets:
+            f.seek(offset)
+            yield json.loads(f.readline())
+
+def history(path, channel_id):
+    # Entries for one deal, in order, through the offset index
+    index = sqlite3.connect(f"{path}.idx")
+    try:
+        offsets = [row[0] for row in index.execute(
+            "SELECT offset FROM entries WHERE channel_id = ? ORDER BY offset", (channel_id,)
+        )]
+    finally:
+        index.close()
+    return list(read_entries(path, offsets))
+
+def apply(deals, entry):
+    channel_id = entry['channel_id']
+    event = entry['event']
+    if event == 'stage':
+        deals[channel_id] = {**entry['deal'], 'stage': entry['stage']}
+        return
+    deal = deals.setdefault(channel_id, {'channel_id': channel_id})
+    if event == 'payment_detected':
+        deal.update(txid=entry['txid'], payment_amount=entry.get('amount'))
+    elif event == 'payment_confirmed':
+        deal.update(txid=entry['txid'], stage='awaiting_release')
+    elif event == 'released':
+        deal.update(
+            release_txid=entry['txid'],
+            release_address=entry['address'],
+            released_by=entry.get('actor'),
+            stage='released'
+        )
+    elif event == 'closed':
+        deal['closed_at'] = entry['ts']
+
+def replay(path, channel_id=None):
+    # Rebuilds the last known state of every deal, or of one deal
+    deals = {}
+    entries = read_entries(path) if channel_id is None else history(path, channel_id)
+    for entry in entries:
+        apply(deals, entry)
+    return deals
+
+def reindex(path):
+    if os.path.exists(f"{path}.idx"):
+        os.remove(f"{path}.idx")
+    Journal(path).close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the deal audit journal")
+    parser.add_argument('--path', default='journal.jsonl')
+    commands = parser.add_subparsers(dest='command', required=True)
+    show = commands.add_parser('show', help="history and replayed state of one deal")
+    show.add_argument('channel_id', type=int)
+    rebuild = commands.add_parser('rebuild', help="replay the whole journal")
+    rebuild.add_argument('--out', help="write the rebuilt deals to this JSON file")
+    commands.add_parser('reindex', help="rebuild the offset index from the journal")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == 'show':
+        entries = history(args.path, args.channel_id)
+        for entry in entries:
+            stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry['ts']))
+            fields = {k: v for k, v in entry.items() if k not in ('ts', 'channel_id', 'event', 'deal')}
+            print(f"{stamp}  {entry['event']:<18} {json.dumps(fields) if fields else ''}")
+        deals = {}
+        for entry in entries:
+            apply(deals, entry)
+        print(json.dumps(deals.get(args.channel_id), indent=2))
+        print(f"{len(entries)} entries in {(time.perf_counter() - start) * 1000:.1f} ms")
+    elif args.command == 'rebuild':
+        deals = replay(args.path)
+        if args.out:
+            with open(args.out, 'w') as f:
+                json.dump(list(deals.values()), f)
+        for stage, count in Counter(deal.get('stage') for deal in deals.values()).most_common():
+            print(f"{stage:<20} {count}")
+        print(f"{len(deals)} deals in {(time.perf_counter() - start) * 1000:.0f} ms")
+    else:
+        reindex(args.path)
+        print(f"Reindexed {args.path} in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import sqlite3
+import threading
+import time
+
+class LeaseTable:
+    def __init__(self, path='deals.db', owner='main', ttl=30):
+        self.owner = owner
+        self.ttl = ttl
+        self.held = set()
+        self.lock = threading.Lock()
+        # Lives next to the deals table so orphaned deals can be found with a join
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # A lease is rewritten every few seconds and lost leases just expire
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS leases (
+                channel_id INTEGER PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+
+    def acquire(self, channel_id):
+        # Free and expired leases can be taken, and our own are extended
+        now = time.time()
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO leases (channel_id, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (channel_id) DO UPDATE SET "
+                "owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.owner = excluded.owner OR leases.expires_at < ?",
+                (channel_id, self.owner, now + self.ttl, now)
+            )
+        if cursor.rowcount:
+            self.held.add(channel_id)
+            return True
+        self.held.discard(channel_id)
+        return False
+
+    def renew(self):
+        # Returns the leases another worker took over since the last renewal
+        expires_at = time.time() + self.ttl
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "UPDATE leases SET expires_at = ? WHERE channel_id = ? AND owner = ?",
+                [(expires_at, channel_id, self.owner) for channel_id in self.held]
+            )
+            owned = {
+                row[0] for row in self.conn.execute(
+                    "SELECT channel_id FROM leases WHERE owner = ?", (self.owner,)
+                )
+            }
+        lost = self.held - owned
+        self.held -= lost
+        return lost
+
+    def release(self, channel_id):
+        # The row is left to expire rather than deleted, so the deal can't be
+        # adopted before its own delete reaches the store
+        self.held.discard(channel_id)
+
+    def owner_of(self, channel_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT owner FROM leases WHERE channel_id = ? AND expires_at >= ?",
+                (channel_id, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def orphans(self):
+        # Stored deals nobody holds a live lease on, e.g. after a worker died
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM leases WHERE expires_at < ? "
+                "AND channel_id NOT IN (SELECT channel_id FROM deals)",
+                (now - self.ttl,)
+            )
+            rows = self.conn.execute(
+                "SELECT deals.channel_id FROM deals "
+                "LEFT JOIN leases ON leases.channel_id = deals.channel_id "
+                "WHERE leases.channel_id IS NULL OR leases.expires_at < ?",
+                (now,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
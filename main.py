@@ -2,23 +2,416 @@ import discord
 from discord.ext import commands, tasks
 from discord import ui, ButtonStyle, Embed
 import asyncio
-import json
-import os
+import importlib
+import io
+import math
+import time
 from datetime import datetime
 from utils import *
-from sochain import check_payment
+from chain import ChainError, ChainRouter
+from sochain import SoChainClient
+from blockcypher import BlockcypherClient
+from node import NodeClient
+from addresses import AddressIndex, SharedAddressIndex
+from payments import poll_payments, match_output
+from amounts import AmountIndex, SharedAmountIndex, to_litoshis, format_ltc
+from confirmations import ConfirmationTracker
+from status import RestCounter, StatusBoard
+from gateway import client_options
+from leases import LeaseTable
+from admission import ONBOARDING, PAYMENT, AdmissionGate, QueueFull
+from users import UserCache
+from settings import load_settings
+from assets import AssetCache, invoice_qr
+from metrics import metrics
+from shards import current_worker, worker_options
+from cursors import TxCursors
+from rates import COINGECKO_URL, RateService
+from store import DealStore
+from registry import DealRegistry
+from journal import Journal
+from scheduler import DeadlineScheduler
+from dispatcher import MessageDispatcher
+from wallet import PayoutRejected, WalletService
+from fees import FeeEstimator
+from payouts import PayoutQueue
+from push import ZmqWatcher
 
-# Load config
-with open('config.json') as f:
-    config = json.load(f)
+# Validated once; a bad config.json fails here with the offending key
+settings = load_settings()
 
-intents = discord.Intents.all()
-bot = commands.Bot(command_prefix='$', intents=intents)
-active_deals = {}
+# With several worker processes, deal state, addresses and leases are shared
+# through deals.db and each worker only runs the deals it holds a lease on
+worker = current_worker()
+workers = settings.workers
+worker_name = f"worker-{worker}"
+metrics.enabled = settings.metrics
+deal_store_path = settings.deal_store_path
+
+def make_chain_backend(spec):
+    timeout = spec.get('timeout', settings.chain_timeout)
+    if spec['type'] == 'sochain':
+        return SoChainClient(
+            base_url=spec.get('url', 'https://sochain.com/api/v2'),
+            timeout=timeout,
+            max_concurrency=spec.get('concurrency', settings.chain_concurrency),
+            name=spec.get('name', 'sochain')
+        )
+    if spec['type'] == 'blockcypher':
+        return BlockcypherClient(
+            base_url=spec.get('url', 'https://api.blockcypher.com/v1/ltc/main'),
+            token=spec.get('token'),
+            timeout=timeout,
+            name=spec.get('name', 'blockcypher')
+        )
+    if spec['type'] == 'node':
+        return NodeClient(spec['url'], timeout=spec.get('timeout', 30), name=spec.get('name', 'node'))
+    raise ValueError(f"Unknown chain backend type: {spec['type']}")
+
+chain = ChainRouter(
+    [make_chain_backend(spec) for spec in settings.chain_backends],
+    failure_threshold=settings.chain_failure_threshold,
+    cooldown=settings.chain_cooldown,
+    max_hedge_delay=settings.chain_max_hedge_delay
+)
+rates = RateService(
+    ttl=settings.rate_ttl,
+    stale_ttl=settings.rate_stale_ttl,
+    url=settings.rate_url or COINGECKO_URL
+)
+
+# Addresses, keys and the QR image are read once and reloaded on change
+assets = AssetCache(watch_interval=settings.asset_watch_interval)
+
+fee_estimator = FeeEstimator(
+    chain,
+    ttl=settings.fee_rate_ttl,
+    default_rate=settings.default_fee_rate
+)
+wallet_service = WalletService(
+    lambda: assets.current.wif_key,
+    witness_type=get_witness_type(assets.current.ltc_address),
+    fee_rates=fee_estimator,
+    lock_path=settings.wallet_lock_path if workers > 1 else None,
+    dust_threshold=settings.utxo_dust_threshold,
+    consolidate_min=settings.utxo_consolidate_min,
+    max_consolidation_fee_rate=settings.max_consolidation_fee_rate,
+    reserve=settings.utxo_reserve,
+    quiet_period=settings.wallet_quiet_period,
+    deposits=lambda: [
+        deal['deposit_index'] for deal in list(active_deals.values()) if 'deposit_index' in deal
+    ],
+    on_broadcast=lambda txid, addresses: note_wallet_tx(txid, addresses)
+)
+payouts = PayoutQueue(wallet_service, window=settings.payout_window)
+
+BotBase = commands.AutoShardedBot if settings.shard_count else commands.Bot
+
+class MMBot(BotBase):
+    async def setup_hook(self):
+        # Only deal channels this worker holds a lease on are counted
+        rest_counter.install(self.http, counts=lambda channel_id: channel_id in leases.held)
+        assets.start()
+        await metrics.start(
+            path=settings.metrics_path,
+            interval=settings.metrics_interval,
+            port=settings.metrics_port
+        )
+        await recover_deals()
+        deal_store.start()
+        journal.start()
+
+    async def close(self):
+        scheduler.stop()
+        payouts.stop()
+        assets.stop()
+        if zmq_watcher:
+            zmq_watcher.stop()
+        await chain.close()
+        await rates.close()
+        await metrics.stop()
+        await super().close()
+        await deal_store.close()
+        journal.close()
+        leases.close()
+        wallet_service.close()
+
+bot = MMBot(
+    command_prefix='$',
+    **client_options(
+        low_footprint=settings.low_footprint,
+        max_messages=settings.message_cache_size
+    ),
+    **worker_options(settings, worker)
+)
+# Open deals, indexed by stage; stages only change through advance()
+active_deals = DealRegistry()
+if workers > 1:
+    address_index = SharedAddressIndex(
+        deal_store_path,
+        legacy_path=settings.address_index_path
+    )
+    # Adopted deals keep amounts from another worker's residue class, so
+    # claims are shared too
+    amount_index = SharedAmountIndex(deal_store_path, stride=workers, offset=worker)
+else:
+    address_index = AddressIndex(settings.address_index_path)
+    amount_index = AmountIndex()
+confirmation_tracker = ConfirmationTracker(settings.confirmations)
+monitor_lock = asyncio.Lock()
+status_board = StatusBoard(
+    enabled=settings.compact_messages,
+    debounce=settings.status_debounce
+)
+rest_counter = RestCounter()
+# Caps concurrent REST bursts so a wave of new tickets can't starve deals
+# that are waiting on payment or release
+admission = AdmissionGate(settings.onboarding_concurrency, settings.max_queued_tickets)
+user_cache = UserCache(bot.fetch_user, ttl=settings.user_cache_ttl)
+tx_cursors = TxCursors(
+    settings.cursor_path or ('cursors.json' if workers == 1 else f"cursors-{worker_name}.json")
+)
+# Durable record of stage changes, payments and releases for disputes
+journal = Journal(
+    settings.journal_path or ('journal.jsonl' if workers == 1 else f"journal-{worker_name}.jsonl"),
+    flush_interval=settings.journal_flush_interval
+)
+deal_store = DealStore(deal_store_path, journal=journal)
+leases = LeaseTable(deal_store_path, owner=worker_name, ttl=settings.lease_ttl)
+scheduler = DeadlineScheduler()
+dispatcher = MessageDispatcher(lambda channel_id: active_deals.get(channel_id, {}).get('stage'))
+metrics.gauge('deals by stage', active_deals.counts)
+metrics.gauge('payout queue', lambda: payouts.queue.qsize())
+metrics.gauge('wallet', wallet_service.status)
+metrics.gauge('admission', admission.status)
+metrics.gauge('user cache', lambda: {'hits': user_cache.hits, 'misses': user_cache.misses})
+
+async def per_deal_xpub():
+    # xpub.txt is only used when the wallet holds its account xprv, since
+    # deposits to addresses the wallet can't sign for could never be paid out
+    xpub = assets.current.xpub
+    if xpub and await asyncio.to_thread(xpub_matches_key, xpub, assets.current.wif_key or ''):
+        return xpub
+    return None
+
+async def assign_deposit_address(deal):
+    # Each deal gets its own address when an xpub is configured. Derivation
+    # and the index write run off the event loop. The index stays on the
+    # deal so the wallet only watches deposits of open deals
+    xpub = await per_deal_xpub()
+    if not xpub:
+        deal['deposit_address'] = assets.current.ltc_address
+        return
+    address, index = await asyncio.to_thread(address_index.allocate, deal['channel_id'], xpub)
+    await wallet_service.register_deposit(index)
+    deal['deposit_address'] = address
+    deal['deposit_index'] = index
+
+cursor_lock = asyncio.Lock()
+
+async def seed_cursor(address, attempts=3):
+    # Before the first invoice on a shared address goes out, its cursor is
+    # set to the latest tx so older payments can never match a deal. Per-deal
+    # addresses are new, anything paid to them belongs to the deal. Raises
+    # ChainError if the address history can't be fetched
+    if tx_cursors.known(address):
+        return
+    async with cursor_lock:
+        for attempt in range(attempts):
+            if tx_cursors.known(address):
+                return
+            try:
+                txs = await chain.get_received_txs(address)
+                break
+            except ChainError as e:
+                print(f"Could not seed the tx cursor for {address}: {e}")
+                if attempt == attempts - 1:
+                    raise
+                await asyncio.sleep(2 ** attempt)
+        tx_cursors.seed(address, txs)
+        tx_cursors.save()
+
+def uses_shared_address(deal):
+    return address_index.lookup(deal['deposit_address']) != deal['channel_id']
+
+async def release_amount(deal):
+    # Shared claims are an SQLite write, kept off the event loop
+    if not deal.get('deposit_address') or not uses_shared_address(deal):
+        return
+    if amount_index.lookup(deal['deposit_address'], deal['amount_litoshis']) == deal['channel_id']:
+        await asyncio.to_thread(
+            amount_index.release, deal['deposit_address'], deal['amount_litoshis'], deal['channel_id']
+        )
+
+async def resolve_user(user_id):
+    if user_id is None:
+        return None
+    return bot.get_user(user_id) or await user_cache.get(user_id)
+
+# Stages that wait on a prompt or a button view, neither of which survives a
+# restart. Their deadline is stored on the deal as prompt_deadline
+PROMPT_STAGES = ('roles', 'awaiting_amount', 'amount_confirmation')
+# A payment has been seen; these deals are never expired or closed
+SETTLING_STAGES = ('confirming', 'awaiting_release')
+OPEN_STAGES = PROMPT_STAGES + ('payment', 'expired') + SETTLING_STAGES
+VIEW_TIMEOUT = 3600
+
+async def restore_deal(deal):
+    for role in ('sender', 'receiver'):
+        deal[role] = await resolve_user(deal.pop(f"{role}_id", None))
+    if 'amount_ltc' in deal:
+        deal['amount_litoshis'] = to_litoshis(f"{deal.pop('amount_ltc'):.8f}")
+    active_deals.add(deal)
+    unmined = deal['stage'] == 'confirming' and deal.get('tx_height') is None
+    if (deal['stage'] == 'payment' or unmined) and uses_shared_address(deal):
+        await asyncio.to_thread(
+            amount_index.claim, deal['deposit_address'], deal['channel_id'], deal['amount_litoshis']
+        )
+    if deal['stage'] == 'payment' and deal.get('deadline'):
+        schedule_deal_timeout(deal)
+    if unmined:
+        schedule_mempool_timeout(deal)
+    if deal['stage'] == 'expired':
+        # Stopped between expiring and closing, finish the close now
+        scheduler.schedule(('deal', deal['channel_id']), 0, expire_deal, deal['channel_id'])
+    if deal['stage'] == 'awaiting_release' and deal.get('release_message_id'):
+        bot.add_view(ReleaseView(deal['channel_id']), message_id=deal['release_message_id'])
+    if deal['stage'] in PROMPT_STAGES:
+        # Nothing can answer the prompt any more, so the deal closes when it
+        # would have expired, or at once if no deadline was stored
+        scheduler.schedule(
+            ('input', deal['channel_id']),
+            deal.get('prompt_deadline', 0),
+            expire_prompt,
+            deal['channel_id']
+        )
+
+async def recover_deals():
+    # Rebuild the in-memory working set before the gateway connects. Deals
+    # another live worker holds stay with it
+    pruned = deal_store.prune('released')
+    if pruned:
+        print(f"Removed {pruned} released deals from the store")
+    stored = await asyncio.to_thread(
+        lambda: [deal for stage in OPEN_STAGES for deal in deal_store.by_stage(stage)]
+    )
+    if workers == 1:
+        # Entries left by deals that closed before they were pruned on close
+        stale = await asyncio.to_thread(address_index.prune, {deal['channel_id'] for deal in stored})
+        for address in stale:
+            tx_cursors.forget(address)
+        tx_cursors.save()
+    deals = await asyncio.to_thread(
+        lambda: [deal for deal in stored if leases.acquire(deal['channel_id'])]
+    )
+    await asyncio.gather(*(restore_deal(deal) for deal in deals))
+    bot.add_view(InvoiceButtons())
+    print(f"Recovered {len(deals)} deals")
+
+async def drop_deal(channel_id):
+    # Stop working on a deal another worker took over; the store keeps it
+    rest_counter.discard(channel_id)
+    release_locks.pop(channel_id, None)
+    deal = active_deals.pop(channel_id, None)
+    if deal is None:
+        return
+    scheduler.cancel(('deal', channel_id))
+    scheduler.cancel(('input', channel_id))
+    dispatcher.expire(channel_id)
+    deal_store.forget(channel_id)
+    status_board.forget(channel_id)
+    await release_amount(deal)
+    print(f"Lease for deal {channel_id} was taken over by another worker")
+
+async def adopt_deal(channel_id):
+    # Only take deals whose ticket channel this worker's shards can see
+    if channel_id in active_deals or not bot.get_channel(channel_id):
+        return
+    if not await asyncio.to_thread(leases.acquire, channel_id):
+        return
+    deal = deal_store.get(channel_id)
+    if deal is None:
+        return leases.release(channel_id)
+    address_index.load()
+    await restore_deal(deal)
+    print(f"Adopted deal {channel_id}")
+
+@tasks.loop(seconds=settings.lease_ttl / 3)
+async def maintain_leases():
+    try:
+        lost = await asyncio.to_thread(leases.renew)
+        for channel_id in lost:
+            await drop_deal(channel_id)
+        for channel_id in await asyncio.to_thread(leases.orphans):
+            await adopt_deal(channel_id)
+    except Exception as e:
+        print(f"Lease maintenance failed: {e}")
+
+def expire_prompt(channel_id):
+    dispatcher.expire(channel_id)
+    channel = bot.get_channel(channel_id)
+    if channel:
+        return handle_timeout(channel)
+    # The ticket channel went away, there is nothing left to post to
+    return close_deal(channel_id)
+
+def set_prompt_deadline(deal, timeout):
+    # Stored on the deal so the timeout survives a restart; callers save
+    deal['prompt_deadline'] = time.time() + timeout
+    scheduler.schedule(('input', deal['channel_id']), deal['prompt_deadline'], expire_prompt, deal['channel_id'])
+
+async def wait_for_message(channel, parse, stage=None, timeout=300):
+    # The prompt's deadline lives in the shared scheduler, which also runs
+    # the cleanup. Returns the parsed message, or None if the prompt expired
+    key = ('input', channel.id)
+    waiter = dispatcher.wait(channel.id, parse, stage)
+    deal = active_deals.get(channel.id)
+    if deal:
+        set_prompt_deadline(deal, timeout)
+        deal_store.save(deal)
+    else:
+        scheduler.schedule(key, time.time() + timeout, expire_prompt, channel.id)
+    try:
+        return await waiter
+    finally:
+        scheduler.cancel(key)
+        dispatcher.discard(channel.id, waiter)
+
+def schedule_deal_timeout(deal):
+    deal.setdefault('deadline', deal['start_time'].timestamp() + settings.deal_timeout)
+    scheduler.schedule(('deal', deal['channel_id']), deal['deadline'], expire_deal, deal['channel_id'])
+
+def schedule_mempool_timeout(deal):
+    deal.setdefault('mempool_deadline', time.time() + settings.mempool_timeout)
+    scheduler.schedule(
+        ('deal', deal['channel_id']), deal['mempool_deadline'], expire_mempool_payment, deal['channel_id']
+    )
+
+def expire_mempool_payment(channel_id):
+    deal = active_deals.get(channel_id)
+    if deal is None or deal['stage'] != 'confirming' or deal.get('tx_height') is not None:
+        return None
+    # The tx never made it into a block, so it was dropped or replaced. The
+    # deal goes back to waiting for payment and expires from there
+    journal.record(channel_id, 'payment_dropped', txid=deal['txid'])
+    deal.pop('mempool_deadline', None)
+    active_deals.advance(deal, 'payment')
+    deal_store.save(deal)
+    return expire_deal(channel_id)
+
+def expire_deal(channel_id):
+    deal = active_deals.get(channel_id)
+    channel = bot.get_channel(channel_id)
+    if deal is None or deal['stage'] not in ('payment', 'expired'):
+        return None
+    if channel:
+        return handle_timeout(channel)
+    # The ticket channel was deleted, e.g. by staff
+    return close_deal(channel_id)
 
 class RoleView(ui.View):
     def __init__(self, channel_id):
-        super().__init__(timeout=3600)
+        super().__init__(timeout=VIEW_TIMEOUT)
         self.channel_id = channel_id
         self.user_roles = {}
 
@@ -34,11 +427,10 @@ class RoleView(ui.View):
         # Assign new role
         deal['sender'] = interaction.user
         self.user_roles[interaction.user.id] = 'sender'
-        await interaction.channel.send(
-            embed=Embed(
-                description=f"{interaction.user.mention} selected **Sender** role",
-                color=0x000000
-            )
+        deal_store.save(deal)
+        await status_board.note(
+            interaction.channel,
+            f"{interaction.user.mention} selected **Sender** role"
         )
         await self.update_interface(interaction)
 
@@ -54,11 +446,10 @@ class RoleView(ui.View):
         # Assign new role
         deal['receiver'] = interaction.user
         self.user_roles[interaction.user.id] = 'receiver'
-        await interaction.channel.send(
-            embed=Embed(
-                description=f"{interaction.user.mention} selected **Receiver** role",
-                color=0x000000
-            )
+        deal_store.save(deal)
+        await status_board.note(
+            interaction.channel,
+            f"{interaction.user.mention} selected **Receiver** role"
         )
         await self.update_interface(interaction)
 
@@ -91,7 +482,11 @@ class RoleView(ui.View):
             inline=False
         )
         
-        await interaction.response.edit_message(embed=embed, view=self)
+        # Keep any embeds sent alongside the role selection
+        await interaction.response.edit_message(
+            embeds=interaction.message.embeds[:-1] + [embed],
+            view=self
+        )
         
         # Proceed if both roles are filled
         if deal.get('sender') and deal.get('receiver'):
@@ -122,7 +517,7 @@ async def show_role_confirmation(channel):
 
 class ConfirmView(ui.View):
     def __init__(self, confirm_type, channel_id):
-        super().__init__(timeout=3600)
+        super().__init__(timeout=VIEW_TIMEOUT)
         self.confirm_type = confirm_type
         self.channel_id = channel_id
         self.confirmed_users = set()
@@ -136,11 +531,9 @@ class ConfirmView(ui.View):
                 ephemeral=True
             )
         
-        await interaction.channel.send(
-            embed=Embed(
-                description=f"{interaction.user.mention} responded with **Correct**",
-                color=0x000000
-            )
+        await status_board.note(
+            interaction.channel,
+            f"{interaction.user.mention} responded with **Correct**"
         )
         
         self.confirmed_users.add(interaction.user.id)
@@ -169,11 +562,9 @@ class ConfirmView(ui.View):
                 ephemeral=True
             )
         
-        await interaction.channel.send(
-            embed=Embed(
-                description=f"{interaction.user.mention} responded with **Incorrect**",
-                color=0x000000
-            )
+        await status_board.note(
+            interaction.channel,
+            f"{interaction.user.mention} responded with **Incorrect**"
         )
         
         await interaction.message.delete()
@@ -181,6 +572,8 @@ class ConfirmView(ui.View):
         if self.confirm_type == "roles":
             deal['sender'] = None
             deal['receiver'] = None
+            set_prompt_deadline(deal, VIEW_TIMEOUT)
+            deal_store.save(deal)
             await interaction.channel.send(
                 embed=Embed(
                     title="Roles Reset",
@@ -194,61 +587,100 @@ class ConfirmView(ui.View):
 
 async def ask_for_deal_amount(channel):
     deal = active_deals[channel.id]
-    deal['stage'] = 'awaiting_amount'
+    active_deals.advance(deal, 'awaiting_amount')
+    deal_store.save(deal)
     
-    await channel.send(
-        embed=Embed(
-            title="Deal Amount",
-            description="Please enter the amount in USD (e.g. `10` or `0.5`):",
-            color=0x000000
-        )
-    )
-
-    def check(m):
+    def parse_amount(m):
+        if m.author != deal['sender']:
+            return None
         try:
-            float(m.content)
-            return (
-                m.channel == channel and 
-                m.author == deal['sender']
-            )
+            amount = float(m.content)
         except ValueError:
-            return False
+            return None
+        # float() also takes "nan" and "inf"
+        return amount if math.isfinite(amount) and amount > 0 else None
 
-    try:
-        msg = await bot.wait_for('message', check=check, timeout=300)
-        usd_amount = float(msg.content)
-        ltc_amount = usd_amount / get_live_rate()
-        
-        deal.update({
-            'amount_usd': usd_amount,
-            'amount_ltc': ltc_amount,
-            'stage': 'amount_confirmation'
-        })
-
-        # Send amount confirmation
-        confirm_embed = Embed(
-            title="Confirm Amount",
-            description=f"**${usd_amount:.2f} USD** ≈ `{ltc_amount:.8f} LTC`",
-            color=0x000000
-        )
+    description = "Please enter the amount in USD (e.g. `10` or `0.5`):"
+    while True:
         await channel.send(
-            embed=confirm_embed,
-            view=ConfirmView("amount", channel.id)
+            embed=Embed(title="Deal Amount", description=description, color=0x000000)
         )
-        
-    except asyncio.TimeoutError:
-        await handle_timeout(channel)
+        usd_amount = await wait_for_message(channel, parse_amount, stage='awaiting_amount')
+        if usd_amount is None:
+            return
+        try:
+            rate = await rates.get_rate()
+            break
+        except Exception as e:
+            # The prompt's deadline ended with the wait, so ask again to re-arm it
+            print(f"Rate lookup failed for deal {channel.id}: {e}")
+            description = (
+                "We couldn't fetch the LTC price just now.\n"
+                "Please enter the amount in USD again in a moment:"
+            )
+
+    amount_litoshis = to_litoshis(usd_amount / rate)
+    
+    # The invoice reuses this rate so both screens show the same quote
+    active_deals.advance(
+        deal, 'amount_confirmation',
+        amount_usd=usd_amount,
+        amount_litoshis=amount_litoshis,
+        rate=rate
+    )
+    set_prompt_deadline(deal, VIEW_TIMEOUT)
+    deal_store.save(deal)
+
+    # Send amount confirmation
+    confirm_embed = Embed(
+        title="Confirm Amount",
+        description=f"**${usd_amount:.2f} USD** ≈ `{format_ltc(amount_litoshis)} LTC`",
+        color=0x000000
+    )
+    await channel.send(
+        embed=confirm_embed,
+        view=ConfirmView("amount", channel.id)
+    )
 
 async def show_payment_invoice(channel):
     deal = active_deals[channel.id]
+    if not deal.get('deposit_address'):
+        await assign_deposit_address(deal)
+    if uses_shared_address(deal):
+        try:
+            await seed_cursor(deal['deposit_address'])
+        except ChainError:
+            # No invoice until payments to it can be told apart from history
+            return await channel.send(
+                embed=Embed(
+                    title="⚠️ Invoice Delayed",
+                    description=(
+                        "We couldn't reach the blockchain provider to prepare the invoice.\n"
+                        "Please confirm the amount again in a moment."
+                    ),
+                    color=0x000000
+                ),
+                view=ConfirmView("amount", channel.id)
+            )
+        deal['amount_litoshis'] = await asyncio.to_thread(
+            amount_index.allocate,
+            deal['deposit_address'],
+            channel.id,
+            deal['amount_litoshis']
+        )
+    active_deals.advance(deal, 'payment')
+    scheduler.cancel(('input', channel.id))
+    deal.pop('prompt_deadline', None)
+    schedule_deal_timeout(deal)
+    deal_store.save(deal)
     
     invoice_embed = Embed(
         title="Payment Invoice",
         description=(
-            f"**Send exactly `{deal['amount_ltc']:.8f} LTC` to:**\n"
-            f"`{get_ltc_address()}`\n\n"
+            f"**Send exactly `{format_ltc(deal['amount_litoshis'])} LTC` to:**\n"
+            f"`{deal['deposit_address']}`\n\n"
             f"`USD Amount:` ${deal['amount_usd']:.2f}\n"
-            f"`Exchange Rate:` 1 LTC = ${get_live_rate():.2f}"
+            f"`Exchange Rate:` 1 LTC = ${deal['rate']:.2f}"
         ),
         color=0x000000
     )
@@ -258,31 +690,37 @@ async def show_payment_invoice(channel):
         view=InvoiceButtons()
     )
     
-    await channel.send(
-        embed=Embed(
-            description="Payment invoice has been generated",
-            color=0x000000
-        )
-    )
+    await status_board.note(channel, "Payment invoice has been generated")
 
 class InvoiceButtons(ui.View):
     def __init__(self):
         super().__init__(timeout=None)
 
-    @ui.button(label="Paste", style=ButtonStyle.green)
+    async def interaction_check(self, interaction):
+        # Every worker registers this view, only the deal's owner answers
+        return leases.owner_of(interaction.channel.id) in (None, leases.owner)
+
+    @ui.button(label="Paste", style=ButtonStyle.green, custom_id="invoice_paste")
     async def paste(self, interaction, button):
+        deal = active_deals.get(interaction.channel.id, {})
         await interaction.response.send_message(
-            f"```{get_ltc_address()}```",
+            f"```{deal.get('deposit_address') or assets.current.ltc_address}```",
             ephemeral=True
         )
 
-    @ui.button(label="Scan QR", style=ButtonStyle.blurple)
+    @ui.button(label="Scan QR", style=ButtonStyle.blurple, custom_id="invoice_qr")
     async def qr(self, interaction, button):
-        with open('qr.txt') as f:
-            qr_path = f.read().strip()
-        if os.path.exists(qr_path):
+        # A QR for this deal's address and amount, else the static image
+        deal = active_deals.get(interaction.channel.id, {})
+        image = None
+        if deal.get('deposit_address') and deal.get('amount_litoshis'):
+            image = await asyncio.to_thread(
+                invoice_qr, deal['deposit_address'], deal['amount_litoshis']
+            )
+        image = image or assets.current.qr_image
+        if image:
             await interaction.response.send_message(
-                file=discord.File(qr_path),
+                file=discord.File(io.BytesIO(image), filename='qr.png'),
                 ephemeral=True
             )
         else:
@@ -291,46 +729,104 @@ class InvoiceButtons(ui.View):
                 ephemeral=True
             )
 
+async def warm_up():
+    # Loads what the first payout, address and rate lookups need, after the
+    # gateway is up so none of it delays startup
+    start = time.perf_counter()
+    await asyncio.to_thread(importlib.import_module, 'bitcoinlib.wallets')
+    if assets.current.xpub and not await per_deal_xpub():
+        print(
+            "xpub.txt doesn't match the wallet key in wifkey.txt; per-deal addresses "
+            "need the account xprv there. Using the shared address instead"
+        )
+    try:
+        await rates.get_rate()
+    except Exception as e:
+        print(f"Rate warm-up failed: {e}")
+    await fee_estimator.get_rate()
+    await refresh_tip()
+    print(f"Warm-up finished in {time.perf_counter() - start:.2f}s")
+
+warm_up_task = None
+
 @bot.event
 async def on_ready():
+    global warm_up_task
     print(f"Logged in as {bot.user}")
-    monitor_payments.start()
+    if warm_up_task is None:
+        warm_up_task = asyncio.create_task(warm_up())
+    scheduler.start()
+    payouts.start()
+    if not maintain_leases.is_running():
+        maintain_leases.start()
+    if zmq_watcher:
+        zmq_watcher.start()
+    if not monitor_payments.is_running():
+        monitor_payments.start()
+    if not refresh_wallet.is_running():
+        refresh_wallet.start()
+
+@bot.listen('on_message')
+async def route_message(message):
+    dispatcher.dispatch(message)
 
 @bot.event
 async def on_guild_channel_create(channel):
-    if channel.category_id == int(config['category_id']):
+    if channel.category_id == settings.category_id:
+        # A lease makes sure only one worker runs the ticket
+        if not await asyncio.to_thread(leases.acquire, channel.id):
+            return
         await start_deal(channel)
 
 async def start_deal(channel):
-    await channel.send(
-        f"**{generate_deal_code()}**\n\n"
-        "Please send the Developer ID of the user you're dealing with.\n"
-        "Type `cancel` to cancel the deal."
-    )
-
     try:
-        def check(m):
-            return (
-                m.channel == channel and 
-                m.author != bot.user and
-                (m.content.lower() == 'cancel' or m.content.strip().isdigit())
+        async with admission.slot(ONBOARDING, new=True):
+            await channel.send(
+                f"**{generate_deal_code()}**\n\n"
+                "Please send the Developer ID of the user you're dealing with.\n"
+                "Type `cancel` to cancel the deal."
             )
-        
-        msg = await bot.wait_for('message', check=check, timeout=300)
-        
-        if msg.content.lower() == 'cancel':
-            return await channel.delete()
+    except QueueFull as e:
+        print(f"Turned away ticket {channel.id}: {e}")
+        leases.release(channel.id)
+        rest_counter.discard(channel.id)
+        return await channel.send(
+            embed=Embed(
+                description="⏳ We're handling a lot of tickets right now, please open a new one in a few minutes.",
+                color=0x000000
+            )
+        )
 
+    def parse_developer_id(m):
+        if m.author == bot.user:
+            return None
+        if m.content.lower() == 'cancel':
+            return 'cancel'
+        if m.content.strip().isdigit():
+            return int(m.content.strip())
+        return None
+    
+    user_id = await wait_for_message(channel, parse_developer_id)
+    if user_id is None:
+        return
+
+    if user_id == 'cancel':
+        leases.release(channel.id)
+        rest_counter.discard(channel.id)
+        return await channel.delete()
+
+    async with admission.slot(ONBOARDING):
         try:
-            user_id = int(msg.content.strip())
-            user = await bot.fetch_user(user_id)
+            user = await resolve_user(user_id)
             await channel.set_permissions(user, read_messages=True, send_messages=True)
-            await channel.send(
-                embed=Embed(
-                    description=f"Added {user.mention} to the ticket!",
-                    color=0x000000
-                )
-            )
+            deal = active_deals.add({
+                'channel_id': channel.id,
+                'stage': 'roles',
+                'start_time': datetime.now(),
+                'developer_id': user_id
+            })
+            set_prompt_deadline(deal, VIEW_TIMEOUT)
+            deal_store.save(deal)
 
             welcome_embed = Embed(
                 title="Crypto MM",
@@ -341,24 +837,6 @@ async def start_deal(channel):
                 ),
                 color=0x000000
             )
-            await channel.send(embed=welcome_embed)
-
-            await channel.send(
-                embed=Embed(
-                    title="Please Read!",
-                    description=(
-                        "Please check deal info, confirm your deal and discuss about TOS and warranty.\n"
-                        "Ensure all conversations are done within this ticket."
-                    ),
-                    color=0x000000
-                )
-            )
-
-            active_deals[channel.id] = {
-                'stage': 'roles',
-                'start_time': datetime.now(),
-                'developer_id': user_id
-            }
 
             role_embed = Embed(
                 title="Role Selection",
@@ -375,49 +853,294 @@ async def start_deal(channel):
                 value="None",
                 inline=False
             )
-            
-            await channel.send(
-                embed=role_embed,
+        
+            await status_board.send(
+                channel,
+                [
+                    Embed(
+                        description=f"Added {user.mention} to the ticket!",
+                        color=0x000000
+                    ),
+                    welcome_embed,
+                    Embed(
+                        title="Please Read!",
+                        description=(
+                            "Please check deal info, confirm your deal and discuss about TOS and warranty.\n"
+                            "Ensure all conversations are done within this ticket."
+                        ),
+                        color=0x000000
+                    ),
+                    role_embed
+                ],
                 view=RoleView(channel.id)
             )
-            
-        except ValueError:
+        
+        except discord.NotFound:
             await channel.send(
                 embed=Embed(
                     description="❌ Invalid Developer ID",
                     color=0x000000
                 )
             )
+            leases.release(channel.id)
             await channel.delete()
 
-    except asyncio.TimeoutError:
-        await handle_timeout(channel)
-
 @tasks.loop(seconds=30)
 async def monitor_payments():
-    current_time = datetime.now()
-    for channel_id, deal in list(active_deals.items()):
-        channel = bot.get_channel(channel_id)
-        if not channel:
-            continue
-        
-        if deal['stage'] == 'payment':
-            payment = check_payment(get_ltc_address(), deal['amount_ltc'])
-            if payment:
-                await handle_payment_confirmation(channel, payment)
-            elif (current_time - deal['start_time']).total_seconds() > config["deal_timeout"]:
-                await handle_timeout(channel)
+    # Also run on every ZMQ block, so keep cycles from overlapping
+    async with monitor_lock:
+        with metrics.timer('monitor cycle'):
+            await run_monitor_cycle()
+
+async def refresh_tip():
+    try:
+        return confirmation_tracker.update_tip(await chain.get_block_height())
+    except ChainError as e:
+        print(f"Block height check failed: {e}")
+        return False
+
+async def run_monitor_cycle():
+    # Only deals in the two stages the monitor serves are visited
+    waiting = [
+        deal for deal in active_deals.in_stage('payment')
+        if bot.get_channel(deal['channel_id'])
+    ]
+    confirming = [
+        deal for deal in active_deals.in_stage('confirming')
+        if bot.get_channel(deal['channel_id'])
+    ]
+
+    # Confirmations only change with a new block, so one height check per
+    # cycle decides whether confirming deals need any work at all
+    new_block = False
+    if confirming:
+        new_block = await refresh_tip()
+    waiting_addresses = {deal['deposit_address'] for deal in waiting}
+    in_mempool = [
+        deal for deal in confirming
+        if deal.get('tx_height') is None and
+        (new_block or deal['deposit_address'] in waiting_addresses)
+    ]
+
+    # Deal timeouts are fired by the scheduler, not checked here
+    if waiting or in_mempool:
+        try:
+            matches, observed = await poll_payments(
+                chain, waiting, address_index, amount_index, tx_cursors, in_mempool
+            )
+        except ChainError as e:
+            print(f"Payment poll failed: {e}")
+            matches, observed = [], []
+        if not confirming and any(payment['confirmations'] > 0 for _, payment in matches):
+            # The tip may be stale, and a stale tip would overcount confirmations
+            await refresh_tip()
+        for deal, confirmations in observed:
+            confirmation_tracker.observe(deal, confirmations)
+        for deal, payment in matches:
+            async with admission.slot(PAYMENT):
+                await handle_payment_detected(bot.get_channel(deal['channel_id']), payment)
+
+    if new_block:
+        for deal in confirming:
+            async with admission.slot(PAYMENT):
+                await update_confirmations(bot.get_channel(deal['channel_id']), deal)
+
+async def note_wallet_tx(txid, addresses):
+    # Runs before the wallet sends anything, so none of its own outputs to a
+    # deposit address can be taken for a buyer's payment. An unseeded shared
+    # address is skipped, seeding picks the tx up as history
+    for address in addresses:
+        if address_index.lookup(address) is not None or tx_cursors.known(address):
+            tx_cursors.mark_seen(address, txid)
+    tx_cursors.save()
+
+async def handle_pushed_output(txid, address, value):
+    # Called for every output the node sees, so this has to stay O(1)
+    deal = match_output(address, value, active_deals, address_index, amount_index)
+    channel = bot.get_channel(deal['channel_id']) if deal else None
+    if channel and deal['stage'] == 'payment' and not tx_cursors.is_seen(address, txid):
+        # Keep the poll from matching the same tx again later
+        tx_cursors.mark_seen(address, txid)
+        async with admission.slot(PAYMENT):
+            await handle_payment_detected(channel, {
+                "txid": txid,
+                "amount": format_ltc(value),
+                "confirmations": 0
+            })
+
+async def handle_pushed_block(block_hash):
+    async with monitor_lock:
+        with metrics.timer('monitor cycle'):
+            await run_monitor_cycle()
+
+zmq_watcher = None
+if settings.zmq_endpoint:
+    zmq_watcher = ZmqWatcher(settings.zmq_endpoint, handle_pushed_output, handle_pushed_block)
+
+release_locks = {}
+
+async def release_funds(deal, receiver_address, actor):
+    # Double clicks and a racing $release all resolve to the same payout.
+    # A marker committed before the broadcast keeps that true across
+    # crashes and restarts
+    channel_id = deal['channel_id']
+    async with release_locks.setdefault(channel_id, asyncio.Lock()):
+        if deal.get('release_txid'):
+            return deal['release_txid'], deal['release_address']
+        if not await asyncio.to_thread(leases.acquire, channel_id):
+            raise RuntimeError("This deal is being handled by another worker")
+
+        marker = await asyncio.to_thread(deal_store.payout, channel_id)
+        if marker and marker['txid']:
+            txid, address = marker['txid'], marker['receiver']
+        elif marker:
+            raise RuntimeError(
+                "An earlier payout for this deal may already have been broadcast. "
+                "Check the wallet, then settle it with `$resolvepayout [txid]`"
+            )
+        else:
+            await asyncio.to_thread(
+                deal_store.start_payout, channel_id, receiver_address, deal['amount_litoshis']
+            )
+            journal.record(
+                channel_id, 'release_requested',
+                address=receiver_address, amount_litoshis=deal['amount_litoshis'], actor=actor.id
+            )
+            try:
+                txid, address = await payouts.release(
+                    channel_id,
+                    receiver_address,
+                    deal['amount_litoshis']
+                )
+            except Exception as e:
+                if isinstance(e, PayoutRejected):
+                    # Never reached the network, safe to try again
+                    await asyncio.to_thread(deal_store.clear_payout, channel_id)
+                journal.record(channel_id, 'release_failed', error=str(e), actor=actor.id)
+                raise
+            await asyncio.to_thread(deal_store.finish_payout, channel_id, txid)
+            # The marker answers repeat releases from here on
+            payouts.forget(channel_id)
+            journal.record(
+                channel_id, 'released',
+                txid=txid, address=address, amount_litoshis=deal['amount_litoshis'], actor=actor.id
+            )
+        active_deals.advance(deal, 'released', release_txid=txid, release_address=address)
+        deal_store.save(deal)
+        # Anyone still waiting holds this lock; later callers return on
+        # release_txid without needing it
+        release_locks.pop(channel_id, None)
+    return deal['release_txid'], deal['release_address']
+
+async def record_completion(deal):
+    # REST calls are counted from ticket creation up to the release messages
+    if 'rest_calls' not in deal:
+        deal['rest_calls'] = rest_counter.complete(deal['channel_id'])
+        deal_store.save(deal)
+        print(
+            f"Deal {deal['channel_id']} completed with {deal['rest_calls']} REST calls "
+            f"(average {rest_counter.average():.1f})"
+        )
+        await archive_deal(deal)
+
+async def archive_deal(deal):
+    # A released deal leaves the store too (the registry dropped it on
+    # advance), along with its address and cursor entries; its history
+    # stays in the journal and its payout marker in the store
+    channel_id = deal['channel_id']
+    scheduler.cancel(('deal', channel_id))
+    scheduler.cancel(('input', channel_id))
+    deal_store.delete(channel_id)
+    leases.release(channel_id)
+    status_board.finish(channel_id)
+    await release_deposit(deal)
+
+@tasks.loop(minutes=5)
+async def refresh_wallet():
+    # Loads the wallet on the first run, then keeps its UTXOs current and
+    # tidies them up while no payouts are waiting
+    try:
+        await wallet_service.refresh()
+        if payouts.queue.empty():
+            await wallet_service.maintain()
+    except Exception as e:
+        print(f"Wallet refresh failed: {e}")
+
+def pending_embed(deal, confirmations):
+    return Embed(
+        title="⏳ Payment Pending",
+        description=(
+            f"**Amount:** {format_ltc(deal['amount_litoshis'])} LTC\n"
+            f"**TXID:** `{deal['txid']}`\n"
+            f"**Confirmations:** {confirmations}/{deal['required_confirmations']}\n\n"
+            "Payment seen on the network, waiting for confirmations."
+        ),
+        color=0x000000
+    )
+
+async def handle_payment_detected(channel, payment):
+    deal = active_deals[channel.id]
+    active_deals.advance(
+        deal, 'confirming',
+        txid=payment['txid'],
+        required_confirmations=confirmation_tracker.required(deal['amount_usd'])
+    )
+    confirmation_tracker.observe(deal, payment['confirmations'])
+    if deal.get('tx_height') is None:
+        # The amount stays claimed until the tx is in a block, it may yet be
+        # dropped or replaced
+        schedule_mempool_timeout(deal)
+    else:
+        scheduler.cancel(('deal', channel.id))
+        await release_amount(deal)
+    journal.record(
+        channel.id, 'payment_detected',
+        txid=payment['txid'], amount=payment.get('amount'), confirmations=payment['confirmations']
+    )
+
+    confirmations = confirmation_tracker.confirmations(deal)
+    if confirmations >= deal['required_confirmations']:
+        return await handle_payment_confirmation(channel, payment)
+
+    message = await channel.send(embed=pending_embed(deal, confirmations))
+    deal['confirmations'] = confirmations
+    deal['pending_message_id'] = message.id
+    deal_store.save(deal)
+
+async def update_confirmations(channel, deal):
+    if deal.get('tx_height') is not None:
+        await release_amount(deal)
+    confirmations = confirmation_tracker.confirmations(deal)
+    if confirmations >= deal['required_confirmations']:
+        return await handle_payment_confirmation(channel, {
+            'txid': deal['txid'],
+            'confirmations': confirmations
+        })
+    if confirmations != deal.get('confirmations'):
+        deal['confirmations'] = confirmations
+        deal_store.save(deal)
+        try:
+            await channel.get_partial_message(deal['pending_message_id']).edit(
+                embed=pending_embed(deal, confirmations)
+            )
+        except discord.HTTPException as e:
+            print(f"Could not update pending message in {channel.id}: {e}")
 
 async def handle_payment_confirmation(channel, payment):
     deal = active_deals[channel.id]
-    deal['txid'] = payment['txid']
-    deal['stage'] = 'awaiting_release'
+    active_deals.advance(deal, 'awaiting_release', txid=payment['txid'])
+    scheduler.cancel(('deal', channel.id))
+    await release_amount(deal)
+    journal.record(
+        channel.id, 'payment_confirmed',
+        txid=payment['txid'], confirmations=payment['confirmations']
+    )
     
-    await channel.send(
+    message = await channel.send(
         embed=Embed(
             title="✅ Payment Received",
             description=(
-                f"**Amount:** {deal['amount_ltc']:.8f} LTC\n"
+                f"**Amount:** {format_ltc(deal['amount_litoshis'])} LTC\n"
                 f"**TXID:** `{payment['txid']}`\n\n"
                 "Please confirm release of funds."
             ),
@@ -425,15 +1148,19 @@ async def handle_payment_confirmation(channel, payment):
         ),
         view=ReleaseView(channel.id)
     )
+    deal['release_message_id'] = message.id
+    deal_store.save(deal)
     
-    await channel.send(
-        embed=Embed(
-            description="Payment detected on blockchain, awaiting release confirmation",
-            color=0x000000
-        )
+    await status_board.note(
+        channel,
+        "Payment detected on blockchain, awaiting release confirmation"
     )
 
 async def handle_timeout(channel):
+    deal = await expire(channel.id)
+    if deal and deal['stage'] in SETTLING_STAGES:
+        # Paid just before the deadline fired
+        return
     await channel.edit(name="⚠️-timeout")
     await channel.send(
         embed=Embed(
@@ -444,17 +1171,59 @@ async def handle_timeout(channel):
     )
     await asyncio.sleep(10)
     await channel.delete()
-    if channel.id in active_deals:
-        del active_deals[channel.id]
+    await close_deal(channel.id)
+
+async def expire(channel_id):
+    # Takes the deal out of 'payment' and gives up its amount and address
+    # before anything is posted, so a payment arriving while the channel
+    # winds down can't attach to a deal that is about to be deleted
+    deal = active_deals.get(channel_id)
+    if deal is None or deal['stage'] in SETTLING_STAGES or deal['stage'] == 'expired':
+        return deal
+    active_deals.advance(deal, 'expired')
+    deal_store.save(deal)
+    await release_deposit(deal)
+    return deal
+
+async def release_deposit(deal):
+    channel_id = deal['channel_id']
+    await release_amount(deal)
+    if address_index.lookup(deal.get('deposit_address')) == channel_id:
+        await asyncio.to_thread(address_index.release, deal['deposit_address'])
+        tx_cursors.forget(deal['deposit_address'])
+        tx_cursors.save()
+
+async def close_deal(channel_id):
+    # Drops an expired deal from memory, the store and the indexes. A ticket
+    # that never got past the developer ID prompt only holds a lease
+    deal = active_deals.get(channel_id)
+    if deal and deal['stage'] in SETTLING_STAGES:
+        print(f"Not closing deal {channel_id}, a payment for it is {deal['stage']}")
+        return
+    leases.release(channel_id)
+    rest_counter.discard(channel_id)
+    if deal is None:
+        return
+    active_deals.pop(channel_id)
+    scheduler.cancel(('deal', channel_id))
+    scheduler.cancel(('input', channel_id))
+    deal_store.delete(channel_id)
+    status_board.forget(channel_id)
+    await release_deposit(deal)
 
 class ReleaseView(ui.View):
     def __init__(self, channel_id):
         super().__init__(timeout=None)
         self.channel_id = channel_id
 
-    @ui.button(label="Release", style=ButtonStyle.green)
+    @ui.button(label="Release", style=ButtonStyle.green, custom_id="release_funds")
     async def release(self, interaction, button):
-        deal = active_deals[self.channel_id]
+        deal = active_deals.get(self.channel_id)
+        if deal is None:
+            return await interaction.response.send_message(
+                "This deal is already closed.",
+                ephemeral=True
+            )
         if interaction.user not in [deal['sender'], deal['receiver']]:
             return await interaction.response.send_message(
                 "❌ Only deal participants can release funds!",
@@ -484,8 +1253,14 @@ class AddressModal(ui.Modal):
                 ephemeral=True
             )
         
-        deal = active_deals[self.channel_id]
+        deal = active_deals.get(self.channel_id)
+        if deal is None:
+            return await interaction.response.send_message(
+                "This deal is already closed.",
+                ephemeral=True
+            )
         deal['receiver_address'] = self.address.value
+        deal_store.save(deal)
         
         await interaction.response.send_message(
             embed=Embed(
@@ -504,40 +1279,43 @@ class ConfirmAddressView(ui.View):
 
     @ui.button(label="Confirm", style=ButtonStyle.green)
     async def confirm(self, interaction, button):
-        deal = active_deals[self.channel_id]
-        try:
-            txid = send_ltc(
-                deal['receiver_address'],
-                deal['amount_ltc'],
-                get_wif_key()
+        deal = active_deals.get(self.channel_id)
+        if deal is None:
+            return await interaction.response.edit_message(
+                content="This deal is already closed.",
+                embed=None,
+                view=None
             )
+        # Signing and broadcast can take a while, keep the interaction alive
+        await interaction.response.defer()
+        try:
+            txid, address = await release_funds(deal, deal['receiver_address'], interaction.user)
             
-            await interaction.channel.send(
-                embed=Embed(
-                    description=f"{interaction.user.mention} confirmed address",
-                    color=0x000000
-                )
+            await status_board.note(
+                interaction.channel,
+                f"{interaction.user.mention} confirmed address"
             )
             
             await interaction.channel.send(
                 embed=Embed(
                     title="✅ Litecoin Released",
                     description=(
-                        f"**Amount:** {deal['amount_ltc']:.8f} LTC\n"
-                        f"**Receiver:** `{deal['receiver_address']}`\n"
+                        f"**Amount:** {format_ltc(deal['amount_litoshis'])} LTC\n"
+                        f"**Receiver:** `{address}`\n"
                         f"**TXID:** `{txid}`"
                     ),
                     color=0x000000
                 )
             )
-            await interaction.response.edit_message(
+            await record_completion(deal)
+            await interaction.edit_original_response(
                 content="Funds released successfully!",
                 embed=None,
                 view=None
             )
             
         except Exception as e:
-            await interaction.response.send_message(
+            await interaction.followup.send(
                 f"❌ Release failed: {str(e)}",
                 ephemeral=True
             )
@@ -555,6 +1333,8 @@ class ConfirmAddressView(ui.View):
 async def release(ctx, receiver_address: str):
     """Owner override to release funds"""
     if ctx.channel.id not in active_deals:
+        if leases.owner_of(ctx.channel.id) not in (None, leases.owner):
+            return  # The worker holding the deal answers
         return await ctx.send("No active deal in this channel!")
     
     deal = active_deals[ctx.channel.id]
@@ -563,18 +1343,15 @@ async def release(ctx, receiver_address: str):
         return await ctx.send("❌ Invalid LTC address format!")
     
     try:
-        txid = send_ltc(
-            receiver_address,
-            deal['amount_ltc'],
-            get_wif_key()
-        )
+        txid, address = await release_funds(deal, receiver_address, ctx.author)
+        await record_completion(deal)
         
         await ctx.send(
             embed=Embed(
                 title="💰 Funds Released (Owner Override)",
                 description=(
-                    f"**Amount:** {deal['amount_ltc']:.8f} LTC\n"
-                    f"**Receiver:** `{receiver_address}`\n"
+                    f"**Amount:** {format_ltc(deal['amount_litoshis'])} LTC\n"
+                    f"**Receiver:** `{address}`\n"
                     f"**TXID:** `{txid}`"
                 ),
                 color=0x000000
@@ -589,4 +1366,60 @@ async def release(ctx, receiver_address: str):
             )
         )
 
-bot.run(config['bot_token'])
+@bot.command()
+@commands.is_owner()
+async def resolvepayout(ctx, txid: str = None):
+    """Owner-only: settle a payout whose broadcast is uncertain"""
+    marker = await asyncio.to_thread(deal_store.payout, ctx.channel.id)
+    if marker is None or marker['txid']:
+        return await ctx.send("No unsettled payout in this channel.")
+    if txid:
+        # It did go out; the next release picks this txid up
+        await asyncio.to_thread(deal_store.finish_payout, ctx.channel.id, txid)
+        message = f"Recorded payout `{txid}`. Press Release again to finish the deal."
+    else:
+        await asyncio.to_thread(deal_store.clear_payout, ctx.channel.id)
+        message = "Cleared the payout marker. The next release sends a new payout."
+    payouts.forget(ctx.channel.id)
+    journal.record(ctx.channel.id, 'payout_resolved', txid=txid, actor=ctx.author.id)
+    await ctx.send(message)
+
+def format_age(seconds):
+    if seconds < 120:
+        return f"{seconds:.0f}s"
+    if seconds < 7200:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds / 3600:.1f}h"
+
+@bot.command()
+@commands.is_owner()
+async def stats(ctx):
+    """Owner-only snapshot of open deals and throughput"""
+    # Read straight off the registry's indexes, nothing is scanned
+    lines = []
+    for stage, count in active_deals.counts().items():
+        channel_id, waited = active_deals.longest_waiting(stage)
+        lines.append(f"**{stage}:** {count} (longest {format_age(waited)}, <#{channel_id}>)")
+    oldest = active_deals.oldest()
+    recent, total = active_deals.throughput()
+    uptime = time.time() - active_deals.started_at
+    queue = admission.status()
+    lines += [
+        "",
+        f"**Open deals:** {len(active_deals)}",
+        f"**Oldest deal:** {f'{format_age(oldest[1])}, <#{oldest[0]}>' if oldest else 'none'}",
+        f"**Completed:** {recent} in the last hour, {total} in {format_age(uptime)}",
+        f"**Admission:** {queue['active']}/{queue['limit']} busy, "
+        f"{sum(queue['waiting'].values())} waiting, {queue['rejected']} turned away",
+        f"**Payout queue:** {payouts.queue.qsize()}"
+    ]
+    await ctx.send(
+        embed=Embed(
+            title=f"Deal Stats ({worker_name})" if workers > 1 else "Deal Stats",
+            description="\n".join(lines),
+            color=0x000000
+        )
+    )
+
+if __name__ == '__main__':
+    bot.run(settings.bot_token)
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import os
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+# Upper bounds in milliseconds, the last bucket catches everything slower
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, fraction):
+        # Reported as the upper bound of the bucket the percentile falls in
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count if self.count else 0,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': self.max,
+            'buckets': dict(zip([*map(str, BUCKETS_MS), 'inf'], self.counts))
+        }
+
+class Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe((time.perf_counter() - self.start) * 1000)
+
+NOOP = nullcontext()
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.histograms = {}
+        self.gauges = {}
+        self.stages = {}
+        self.tasks = []
+        self.runner = None
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def timer(self, name):
+        # Disabled metrics cost one attribute check per call site
+        if not self.enabled:
+            return NOOP
+        return Timer(self.histogram(name))
+
+    def observe(self, name, seconds):
+        if self.enabled:
+            self.histogram(name).observe(seconds * 1000)
+
+    def gauge(self, name, read):
+        # Gauges are read when a snapshot is taken, never on the hot path
+        self.gauges[name] = read
+
+    def track_stage(self, deal):
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        previous = self.stages.get(deal['channel_id'])
+        if previous is None:
+            self.stages[deal['channel_id']] = (deal['stage'], now)
+        elif previous[0] != deal['stage']:
+            self.observe(f"stage {previous[0]} -> {deal['stage']}", now - previous[1])
+            self.stages[deal['channel_id']] = (deal['stage'], now)
+
+    def forget_deal(self, channel_id):
+        self.stages.pop(channel_id, None)
+
+    def snapshot(self):
+        return {
+            'time': time.time(),
+            'histograms': {
+                name: histogram.snapshot()
+                for name, histogram in sorted(self.histograms.items())
+            },
+            'gauges': {name: read() for name, read in self.gauges.items()}
+        }
+
+    async def sample_lag(self, interval=0.1):
+        histogram = self.histogram('loop lag')
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            histogram.observe(max(0, time.perf_counter() - start - interval) * 1000)
+
+    def write(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    async def dump_every(self, path, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.write(path)
+            except OSError as e:
+                print(f"Metrics dump failed: {e}")
+
+    async def serve(self, port):
+        from aiohttp import web
+
+        async def handle(request):
+            return web.json_response(self.snapshot())
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        # Local only, there is no auth on the endpoint
+        await web.TCPSite(self.runner, '127.0.0.1', port).start()
+
+    async def start(self, path=None, interval=60, port=None):
+        if not self.enabled or self.tasks:
+            return
+        self.tasks.append(asyncio.create_task(self.sample_lag()))
+        if path:
+            self.tasks.append(asyncio.create_task(self.dump_every(path, interval)))
+        if port:
+            await self.serve(port)
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+metrics = Metrics()
@@ -0,0 +1,65 @@
+from amounts import to_litoshis
+
+def payment_from_tx(tx):
+    return {
+        "txid": tx["txid"],
+        "amount": tx["value"],
+        "confirmations": tx["confirmations"]
+    }
+
+def match_output(address, litoshis, deals, address_index, amount_index):
+    # Two dict lookups whatever the number of open deals
+    channel_id = address_index.lookup(address)
+    if channel_id is not None:
+        # Anything paid into a deal's own address belongs to that deal
+        deal = deals.get(channel_id)
+        if deal and litoshis >= deal['amount_litoshis']:
+            return deal
+        return None
+
+    # Shared address, the unique amount identifies the deal
+    channel_id = amount_index.lookup(address, litoshis)
+    return deals.get(channel_id) if channel_id is not None else None
+
+async def poll_payments(chain, deals, address_index, amount_index, cursors, tracked=()):
+    # One lookup per distinct address, however many deals wait on it.
+    # tracked deals already have a tx and only want its confirmations
+    waiting = {deal['channel_id']: deal for deal in deals}
+    by_txid = {deal['txid']: deal for deal in tracked}
+    addresses = {deal['deposit_address'] for deal in deals}
+    addresses.update(deal['deposit_address'] for deal in tracked)
+
+    matches = []
+    observed = []
+    results = await chain.get_many_received_txs({
+        address: cursors.after(address) for address in addresses
+    })
+    for address, txs in results.items():
+        if isinstance(txs, Exception):
+            print(f"Payment check failed for {address}: {txs}")
+            continue
+
+        for tx in txs:
+            if tx["txid"] in by_txid:
+                observed.append((by_txid[tx["txid"]], tx["confirmations"]))
+
+        if not cursors.known(address) and address_index.lookup(address) is None:
+            # Invoices are only posted once their shared address is seeded,
+            # so this only runs if the cursor file was lost
+            cursors.seed(address, txs)
+            continue
+
+        # Only txs newer than the cursor are matched against deals
+        for tx in cursors.advance(address, txs):
+            deal = match_output(
+                address,
+                to_litoshis(tx["value"]),
+                waiting,
+                address_index,
+                amount_index
+            )
+            if deal:
+                matches.append((deal, payment_from_tx(tx)))
+                del waiting[deal['channel_id']]
+    cursors.save()
+    return matches, observed
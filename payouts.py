@@ -0,0 +1,86 @@
+import asyncio
+from wallet import PayoutRejected
+
+class PayoutQueue:
+    def __init__(self, wallet_service, window=2.0, max_outputs=20):
+        self.wallet_service = wallet_service
+        self.window = window
+        self.max_outputs = max_outputs
+        self.queue = asyncio.Queue()
+        self.results = {}
+        self.locks = {}
+        self.task = None
+
+    async def release(self, key, receiver, amount):
+        # A key is only ever paid once; repeat calls get the first call's
+        # (txid, receiver) back, whatever receiver they asked for. A failed
+        # payout is only sent again if it never reached the network
+        lock = self.locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            future = self.results.get(key)
+            if future is None or (future.done() and isinstance(future.exception(), PayoutRejected)):
+                future = asyncio.get_running_loop().create_future()
+                self.results[key] = future
+                self.queue.put_nowait((key, receiver, amount, future))
+        return await asyncio.shield(future)
+
+    def forget(self, key):
+        # Called once the caller has its own record of the payout, or to let
+        # an owner retry one after checking it never went out
+        self.results.pop(key, None)
+        lock = self.locks.get(key)
+        if lock is not None and not lock.locked():
+            del self.locks[key]
+
+    async def next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_outputs:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def pay(self, batch):
+        outputs = [(receiver, amount) for _, receiver, amount, _ in batch]
+        txid = await self.wallet_service.send_many(outputs)
+        for _, receiver, _, future in batch:
+            future.set_result((txid, receiver))
+
+    async def run(self):
+        while True:
+            batch = await self.next_batch()
+            try:
+                await self.pay(batch)
+            except PayoutRejected as e:
+                if len(batch) == 1:
+                    batch[0][3].set_exception(e)
+                    continue
+                # Nothing was broadcast, so one bad output shouldn't hold up
+                # the rest; pay them one by one
+                print(f"Batched payout of {len(batch)} was rejected, retrying singly: {e}")
+                for item in batch:
+                    try:
+                        await self.pay([item])
+                    except Exception as e:
+                        item[3].set_exception(e)
+            except Exception as e:
+                # The transaction may already be on the network; retrying
+                # could pay everyone twice, so the batch is left for review
+                print(f"Batched payout of {len(batch)} failed after signing, not retrying: {e}")
+                for item in batch:
+                    item[3].set_exception(e)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
@@ -0,0 +1,61 @@
+import asyncio
+import struct
+
+class ZmqWatcher:
+    def __init__(self, endpoint, on_output, on_block=None, network='litecoin'):
+        self.endpoint = endpoint
+        self.on_output = on_output
+        self.on_block = on_block
+        self.network = network
+        self.sequence = {}
+        self.parse_tx = None
+        self.task = None
+
+    def check_sequence(self, topic, seq):
+        # litecoind numbers each topic; a gap means we missed messages and
+        # the regular poll has to pick them up
+        expected = self.sequence.get(topic)
+        if expected is not None and seq != expected:
+            print(f"ZMQ {topic.decode()} skipped {seq - expected} messages")
+        self.sequence[topic] = seq + 1
+
+    async def handle(self, topic, body):
+        if topic == b'rawtx':
+            tx = self.parse_tx(body, network=self.network)
+            for output in tx.outputs:
+                if output.address:
+                    await self.on_output(tx.txid, output.address, output.value)
+        elif topic == b'hashblock' and self.on_block:
+            await self.on_block(body.hex())
+
+    async def run(self):
+        # pyzmq and bitcoinlib's parser are only needed when a node endpoint
+        # is configured
+        import zmq
+        import zmq.asyncio
+        from bitcoinlib.transactions import Transaction
+        self.parse_tx = Transaction.parse_bytes
+
+        socket = zmq.asyncio.Context.instance().socket(zmq.SUB)
+        socket.connect(self.endpoint)
+        socket.setsockopt(zmq.SUBSCRIBE, b'rawtx')
+        socket.setsockopt(zmq.SUBSCRIBE, b'hashblock')
+        try:
+            while True:
+                topic, body, seq = await socket.recv_multipart()
+                self.check_sequence(topic, struct.unpack('<I', seq)[0])
+                try:
+                    await self.handle(topic, body)
+                except Exception as e:
+                    print(f"Failed to handle ZMQ {topic.decode()}: {e}")
+        finally:
+            socket.close(linger=0)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
@@ -0,0 +1,51 @@
+import asyncio
+import time
+import aiohttp
+from metrics import metrics
+
+COINGECKO_URL = "https://api.coingecko.com/api/v3/simple/price?ids=litecoin&vs_currencies=usd"
+
+class RateService:
+    def __init__(self, ttl=60, stale_ttl=900, timeout=10, url=COINGECKO_URL):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.url = url
+        self.rate = None
+        self.fetched_at = 0
+        self.inflight = None
+        self.session = None
+
+    async def get_rate(self):
+        age = time.monotonic() - self.fetched_at
+        if self.rate is not None and age < self.ttl:
+            return self.rate
+
+        # Every caller waiting on an expired rate shares one upstream fetch
+        if self.inflight is None:
+            self.inflight = asyncio.ensure_future(self.refresh())
+        try:
+            return await asyncio.shield(self.inflight)
+        except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError) as e:
+            if self.rate is not None and age < self.stale_ttl:
+                print(f"Rate refresh failed, using rate from {age:.0f}s ago: {e}")
+                return self.rate
+            raise
+
+    async def refresh(self):
+        try:
+            if self.session is None or self.session.closed:
+                self.session = aiohttp.ClientSession(timeout=self.timeout)
+            with metrics.timer('rates fetch'):
+                async with self.session.get(self.url) as response:
+                    response.raise_for_status()
+                    data = await response.json(content_type=None)
+            self.rate = float(data["litecoin"]["usd"])
+            self.fetched_at = time.monotonic()
+            return self.rate
+        finally:
+            self.inflight = None
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
@@ -0,0 +1,103 @@
+import heapq
+import time
+from collections import Counter, deque
+
+class DealRegistry:
+    def __init__(self, completed_stage='released', window=3600):
+        # Open deals by channel id, plus per-stage indexes in the order deals
+        # entered each stage, so counts and the longest wait are O(1)
+        self.deals = {}
+        self.stages = {}
+        self.ages = []
+        self.starts = {}
+        self.completed_stage = completed_stage
+        self.window = window
+        self.started_at = time.time()
+        self.completions = deque()
+        self.totals = Counter()
+
+    def __getitem__(self, channel_id):
+        return self.deals[channel_id]
+
+    def __contains__(self, channel_id):
+        return channel_id in self.deals
+
+    def __len__(self):
+        return len(self.deals)
+
+    def get(self, channel_id, default=None):
+        return self.deals.get(channel_id, default)
+
+    def values(self):
+        return self.deals.values()
+
+    def add(self, deal):
+        channel_id = deal['channel_id']
+        self.pop(channel_id)
+        self.deals[channel_id] = deal
+        self.stages.setdefault(deal['stage'], {})[channel_id] = time.time()
+        start = deal['start_time'].timestamp() if deal.get('start_time') else time.time()
+        self.starts[channel_id] = start
+        heapq.heappush(self.ages, (start, channel_id))
+        return deal
+
+    def advance(self, deal, stage, **fields):
+        # The one place a deal's stage changes; other fields set alongside
+        deal.update(fields)
+        previous = deal['stage']
+        deal['stage'] = stage
+        channel_id = deal['channel_id']
+        if channel_id not in self.deals or previous == stage:
+            return deal
+        self.stages[previous].pop(channel_id, None)
+        self.stages.setdefault(stage, {})[channel_id] = time.time()
+        self.totals[stage] += 1
+        if stage == self.completed_stage:
+            # Counted in throughput, then out of the open deals
+            self.completions.append(time.time())
+            self.pop(channel_id)
+        return deal
+
+    def pop(self, channel_id, default=None):
+        # The age heap is cleaned lazily, in oldest() or once it is mostly
+        # entries for deals that are gone
+        deal = self.deals.pop(channel_id, None)
+        if deal is None:
+            return default
+        self.stages[deal['stage']].pop(channel_id, None)
+        self.starts.pop(channel_id, None)
+        if len(self.ages) > 2 * len(self.deals) + 64:
+            self.ages = [(start, channel_id) for channel_id, start in self.starts.items()]
+            heapq.heapify(self.ages)
+        return deal
+
+    def in_stage(self, stage):
+        # Oldest entry into the stage first
+        return [self.deals[channel_id] for channel_id in self.stages.get(stage, ())]
+
+    def counts(self):
+        return {stage: len(deals) for stage, deals in self.stages.items() if deals}
+
+    def longest_waiting(self, stage):
+        # (channel_id, seconds in stage) for the deal that entered first
+        deals = self.stages.get(stage)
+        if not deals:
+            return None
+        channel_id, entered = next(iter(deals.items()))
+        return channel_id, time.time() - entered
+
+    def oldest(self):
+        # (channel_id, age in seconds) of the oldest open deal
+        while self.ages:
+            start, channel_id = self.ages[0]
+            if self.starts.get(channel_id) == start:
+                return channel_id, time.time() - start
+            heapq.heappop(self.ages)
+        return None
+
+    def throughput(self):
+        # Completed deals in the last window, and since startup
+        cutoff = time.time() - self.window
+        while self.completions and self.completions[0] < cutoff:
+            self.completions.popleft()
+        return len(self.completions), self.totals[self.completed_stage]
@@ -0,0 +1,104 @@
+import asyncio
+import heapq
+import inspect
+import itertools
+import time
+
+class DeadlineScheduler:
+    def __init__(self, retry_delay=5, max_retry_delay=300):
+        self.heap = []
+        self.entries = {}
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.failures = {}
+        self.counter = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.running = set()
+        self.task = None
+
+    def schedule(self, key, deadline, callback, *args):
+        # Deadlines are wall-clock timestamps so they can be stored and
+        # rescheduled after a restart
+        self.cancel(key)
+        entry = [deadline, next(self.counter), key, callback, args]
+        self.entries[key] = entry
+        heapq.heappush(self.heap, entry)
+        if self.heap[0] is entry:
+            self.wakeup.set()
+
+    def cancel(self, key):
+        self.failures.pop(key, None)
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        # Cancelled entries stay in the heap until they reach the top
+        entry[3] = None
+        if len(self.heap) > 64 and len(self.heap) > 2 * len(self.entries):
+            self.heap = [e for e in self.heap if e[3] is not None]
+            heapq.heapify(self.heap)
+
+    def is_scheduled(self, key):
+        return key in self.entries
+
+    def fire(self, entry):
+        deadline, _, key, callback, args = entry
+        del self.entries[key]
+        try:
+            result = callback(*args)
+        except Exception as e:
+            return self.retry(key, callback, args, e)
+        if inspect.isawaitable(result):
+            # Cleanup runs on its own so a slow callback can't hold up the next one
+            task = asyncio.ensure_future(result)
+            self.running.add(task)
+            task.add_done_callback(lambda task: self.finished(task, key, callback, args))
+        else:
+            self.failures.pop(key, None)
+
+    def finished(self, task, key, callback, args):
+        self.running.discard(task)
+        if task.cancelled():
+            return
+        if task.exception() is None:
+            self.failures.pop(key, None)
+        else:
+            self.retry(key, callback, args, task.exception())
+
+    def retry(self, key, callback, args, error):
+        # A failed callback runs again after a growing delay, unless the key
+        # was rescheduled in the meantime
+        failures = self.failures.get(key, 0) + 1
+        delay = min(self.retry_delay * 2 ** (failures - 1), self.max_retry_delay)
+        print(f"Deadline callback for {key} failed, retrying in {delay}s: {error!r}")
+        if key not in self.entries:
+            self.schedule(key, time.time() + delay, callback, *args)
+            self.failures[key] = failures
+
+    async def run(self):
+        while True:
+            while self.heap and self.heap[0][3] is None:
+                heapq.heappop(self.heap)
+
+            timeout = None
+            if self.heap:
+                timeout = max(0, self.heap[0][0] - time.time())
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            now = time.time()
+            while self.heap and self.heap[0][0] <= now:
+                entry = heapq.heappop(self.heap)
+                if entry[3] is not None:
+                    self.fire(entry)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
@@ -0,0 +1,123 @@
+import json
+import typing
+from dataclasses import MISSING, dataclass, field, fields
+
+CHAIN_BACKEND_TYPES = ('sochain', 'blockcypher', 'node')
+
+class ConfigError(ValueError):
+    pass
+
+@dataclass(frozen=True)
+class Settings:
+    bot_token: str
+    category_id: int
+    deal_timeout: float
+    # How long a detected payment may stay out of a block before the deal
+    # is treated as unpaid
+    mempool_timeout: float = 86400
+
+    # Chain providers, in preference order
+    chain_backends: list = field(default_factory=lambda: [{'type': 'sochain'}])
+    chain_timeout: float = 10
+    chain_concurrency: int = 8
+    chain_failure_threshold: int = 3
+    chain_cooldown: float = 30
+    chain_max_hedge_delay: float = 2.0
+    zmq_endpoint: typing.Optional[str] = None
+    confirmations: typing.Optional[list] = None
+
+    rate_url: typing.Optional[str] = None
+    rate_ttl: float = 60
+    rate_stale_ttl: float = 900
+    payout_window: float = 2.0
+
+    # Fee rates are litoshis per virtual byte
+    fee_rate_ttl: float = 300
+    default_fee_rate: float = 10
+    max_consolidation_fee_rate: float = 5
+    utxo_dust_threshold: int = 100_000
+    utxo_consolidate_min: int = 10
+    utxo_reserve: int = 2
+    wallet_quiet_period: float = 300
+
+    deal_store_path: str = 'deals.db'
+    address_index_path: str = 'addresses.json'
+    cursor_path: typing.Optional[str] = None
+    wallet_lock_path: str = 'wallet.lock'
+    asset_watch_interval: float = 5
+    journal_path: typing.Optional[str] = None
+    journal_flush_interval: float = 0.2
+
+    compact_messages: bool = False
+    status_debounce: float = 1.5
+    low_footprint: bool = False
+    message_cache_size: typing.Optional[int] = 1000
+
+    onboarding_concurrency: int = 10
+    max_queued_tickets: int = 200
+    user_cache_ttl: float = 600
+
+    shard_count: typing.Optional[int] = None
+    workers: int = 1
+    lease_ttl: float = 30
+
+    metrics: bool = False
+    metrics_path: str = 'metrics.json'
+    metrics_interval: float = 60
+    metrics_port: typing.Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, data):
+        known = {f.name: f for f in fields(cls)}
+        unknown = sorted(set(data) - set(known))
+        if unknown:
+            print(f"Ignoring unknown config keys: {', '.join(unknown)}")
+        missing = [
+            name for name, f in known.items()
+            if name not in data and f.default is MISSING and f.default_factory is MISSING
+        ]
+        if missing:
+            raise ConfigError(f"Missing required config keys: {', '.join(missing)}")
+        settings = cls(**{
+            name: coerce(name, known[name].type, value)
+            for name, value in data.items() if name in known
+        })
+        settings.validate()
+        return settings
+
+    def validate(self):
+        if self.onboarding_concurrency < 1:
+            raise ConfigError("onboarding_concurrency must be at least 1")
+        if self.workers < 1:
+            raise ConfigError("workers must be at least 1")
+        if self.workers > 1 and not self.shard_count:
+            raise ConfigError("workers > 1 needs shard_count")
+        if self.shard_count and self.shard_count < self.workers:
+            raise ConfigError("shard_count must be at least workers")
+        for spec in self.chain_backends:
+            if not isinstance(spec, dict) or spec.get('type') not in CHAIN_BACKEND_TYPES:
+                raise ConfigError(f"Unknown chain backend: {spec!r}")
+            if spec['type'] == 'node' and not spec.get('url'):
+                raise ConfigError("node chain backends need a url")
+        for tier in self.confirmations or ():
+            if not isinstance(tier, dict) or not isinstance(tier.get('confirmations'), int):
+                raise ConfigError(f"Confirmation tiers need an integer 'confirmations': {tier!r}")
+
+def coerce(name, kind, value):
+    # Optional[X] allows null, otherwise the value must be an X. Numeric
+    # strings are accepted for ints since ids are often quoted in the file
+    if typing.get_origin(kind) is typing.Union:
+        if value is None:
+            return None
+        kind = next(arg for arg in typing.get_args(kind) if arg is not type(None))
+    if kind is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    if kind is int and isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    if not isinstance(value, kind) or (kind is not bool and isinstance(value, bool)):
+        raise ConfigError(f"{name} should be {kind.__name__}, got {value!r}")
+    return value
+
+def load_settings(path='config.json'):
+    with open(path) as f:
+        return Settings.from_dict(json.load(f))
@@ -0,0 +1,63 @@
+"""Runs the bot as several sharded worker processes.
+
+Each worker gets an equal slice of the shards and shares deals.db with the
+others. Workers that exit are restarted and pick their deals back up
+through their leases.
+
+Usage: python shards.py
+"""
+import os
+import subprocess
+import sys
+import time
+from settings import load_settings
+
+RESTART_DELAY = 5
+
+def worker_shards(shard_count, workers, worker):
+    # Round robin so every process gets about the same number of guilds
+    return list(range(worker, shard_count, workers))
+
+def current_worker(environ=os.environ):
+    return int(environ.get('MM_WORKER', 0))
+
+def worker_options(settings, worker):
+    # Sharding kwargs for this worker's bot, empty when running unsharded
+    if not settings.shard_count:
+        return {}
+    return {
+        'shard_count': settings.shard_count,
+        'shard_ids': worker_shards(settings.shard_count, settings.workers, worker)
+    }
+
+def spawn(worker):
+    return subprocess.Popen(
+        [sys.executable, 'main.py'],
+        env={**os.environ, 'MM_WORKER': str(worker)}
+    )
+
+def main():
+    settings = load_settings()
+    if not settings.shard_count:
+        sys.exit("Set shard_count (and workers) in config.json to run sharded")
+
+    processes = {worker: spawn(worker) for worker in range(settings.workers)}
+    try:
+        while True:
+            time.sleep(1)
+            for worker, process in processes.items():
+                if process.poll() is None:
+                    continue
+                # Only restart once the old process is gone, so a worker
+                # name is never live twice
+                print(f"Worker {worker} exited with {process.returncode}, restarting")
+                time.sleep(RESTART_DELAY)
+                processes[worker] = spawn(worker)
+    except KeyboardInterrupt:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.wait()
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,47 @@
-import requests
-
-def check_payment(ltc_address, expected_amount):
-    response = requests.get(f"https://sochain.com/api/v2/address/LTC/{ltc_address}")
-    for tx in response.json()["data"]["txs"]:
-        if abs(float(tx["value"]) - expected_amount) < 0.00000001:
-            return {
-                "txid": tx["txid"],
-                "amount": tx["value"],
-                "confirmations": tx["confirmations"]
-            }
-    return None
+import asyncio
+from chain import ChainError, HttpBackend
+from metrics import metrics
+
+SOCHAIN_URL = "https://sochain.com/api/v2"
+
+class SoChainClient(HttpBackend):
+    def __init__(self, base_url=SOCHAIN_URL, timeout=10, max_concurrency=8, name='sochain'):
+        super().__init__(name, base_url, timeout, max_concurrency)
+
+    async def get_json(self, path):
+        # Timed per endpoint, e.g. "sochain get_tx_received"
+        with metrics.timer(f"{self.name} {path.split('/')[1]}"):
+            data = await self.request_json('GET', path)
+        if not isinstance(data, dict) or data.get("status") != "success" or "data" not in data:
+            raise ChainError(f"{self.name} returned an error: {data}")
+        return data
+
+    async def get_block_height(self):
+        data = await self.get_json("/get_info/LTC")
+        return data["data"]["blocks"]
+
+    async def get_received_txs(self, ltc_address, after_txid=None):
+        # SoChain pages received txs oldest first, 100 at a time
+        txs = []
+        while True:
+            path = f"/get_tx_received/LTC/{ltc_address}"
+            if after_txid:
+                path += f"/{after_txid}"
+            data = await self.get_json(path)
+            page = data["data"]["txs"]
+            txs.extend(page)
+            if len(page) < 100:
+                return txs
+            after_txid = page[-1]["txid"]
+
+    async def get_many_received_txs(self, after_txids):
+        # Concurrency is still capped by the semaphore in get_json
+        addresses = list(after_txids)
+        results = await asyncio.gather(
+            *(self.get_received_txs(address, after_txids[address]) for address in addresses),
+            return_exceptions=True
+        )
+        # A total failure counts against the provider, partial ones are per address
+        if results and all(isinstance(result, Exception) for result in results):
+            raise ChainError(f"{self.name} failed every lookup: {results[0]!r}")
+        return dict(zip(addresses, results))
@@ -0,0 +1,102 @@
+import asyncio
+from collections import Counter
+import discord
+from discord import Embed
+from metrics import metrics
+
+MAX_LOG_LINES = 15
+
+class RestCounter:
+    def __init__(self):
+        self.by_channel = Counter()
+        self.completed = []
+
+    def install(self, http, counts=lambda channel_id: True):
+        # Every bot REST call goes through HTTPClient.request, and routes on
+        # a channel carry its id for rate limiting. Only channels `counts`
+        # accepts are tallied, so other traffic doesn't pile up entries
+        request = http.request
+
+        async def counted_request(route, **kwargs):
+            if route.channel_id and counts(route.channel_id):
+                self.by_channel[route.channel_id] += 1
+            if not metrics.enabled:
+                return await request(route, **kwargs)
+            # Timed per route template, so channel ids don't split the histogram
+            with metrics.timer(f"discord {route.method} {route.path}"):
+                return await request(route, **kwargs)
+
+        http.request = counted_request
+
+    def complete(self, channel_id):
+        calls = self.by_channel.pop(channel_id, 0)
+        self.completed.append(calls)
+        return calls
+
+    def discard(self, channel_id):
+        self.by_channel.pop(channel_id, None)
+
+    def average(self):
+        return sum(self.completed) / len(self.completed) if self.completed else 0
+
+class StatusBoard:
+    def __init__(self, enabled=False, debounce=1.5):
+        self.enabled = enabled
+        self.debounce = debounce
+        self.messages = {}
+        self.lines = {}
+        self.flushes = {}
+
+    async def send(self, channel, embeds, view=None):
+        # Compact mode puts related embeds in one message instead of one each
+        if self.enabled:
+            return await channel.send(embeds=embeds, view=view)
+        message = None
+        for i, embed in enumerate(embeds):
+            last = i == len(embeds) - 1
+            if last and view is not None:
+                message = await channel.send(embed=embed, view=view)
+            else:
+                message = await channel.send(embed=embed)
+        return message
+
+    async def note(self, channel, text):
+        if not self.enabled:
+            return await channel.send(embed=Embed(description=text, color=0x000000))
+
+        # Notes land in the deal's status message; edits within the debounce
+        # window go out as one
+        self.lines.setdefault(channel.id, []).append(text)
+        if channel.id not in self.flushes:
+            self.flushes[channel.id] = asyncio.create_task(self.flush_later(channel))
+
+    def render(self, channel_id):
+        lines = self.lines.get(channel_id, [])[-MAX_LOG_LINES:]
+        return Embed(title="Deal Status", description="\n".join(lines), color=0x000000)
+
+    async def flush_later(self, channel):
+        await asyncio.sleep(self.debounce)
+        self.flushes.pop(channel.id, None)
+        try:
+            message = self.messages.get(channel.id)
+            if message is None:
+                self.messages[channel.id] = await channel.send(embed=self.render(channel.id))
+            else:
+                await message.edit(embed=self.render(channel.id))
+        except discord.HTTPException as e:
+            print(f"Could not update status message in {channel.id}: {e}")
+
+    def finish(self, channel_id):
+        # Lets a pending update go out before the deal's state is dropped
+        task = self.flushes.get(channel_id)
+        if task:
+            task.add_done_callback(lambda _: self.forget(channel_id))
+        else:
+            self.forget(channel_id)
+
+    def forget(self, channel_id):
+        task = self.flushes.pop(channel_id, None)
+        if task:
+            task.cancel()
+        self.messages.pop(channel_id, None)
+        self.lines.pop(channel_id, None)
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from metrics import metrics
+
+USER_FIELDS = ('sender', 'receiver')
+
+def serialize_deal(deal):
+    data = {}
+    for key, value in deal.items():
+        if key in USER_FIELDS:
+            data[f"{key}_id"] = value.id if value else None
+        elif isinstance(value, datetime):
+            data[key] = {'datetime': value.timestamp()}
+        else:
+            data[key] = value
+    return json.dumps(data)
+
+def deserialize_deal(raw):
+    deal = {}
+    for key, value in json.loads(raw).items():
+        if isinstance(value, dict) and 'datetime' in value:
+            value = datetime.fromtimestamp(value['datetime'])
+        deal[key] = value
+    return deal
+
+class DealStore:
+    def __init__(self, path='deals.db', flush_interval=0.5, journal=None):
+        self.flush_interval = flush_interval
+        self.journal = journal
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL lets readers run alongside the writer and avoids an fsync per commit
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS deals (
+                channel_id INTEGER PRIMARY KEY,
+                stage TEXT NOT NULL,
+                deposit_address TEXT,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS deals_stage ON deals (stage);
+            CREATE INDEX IF NOT EXISTS deals_deposit_address ON deals (deposit_address);
+            CREATE TABLE IF NOT EXISTS payouts (
+                channel_id INTEGER PRIMARY KEY,
+                receiver TEXT NOT NULL,
+                amount_litoshis INTEGER NOT NULL,
+                txid TEXT,
+                started_at REAL NOT NULL
+            );
+        """)
+        self.pending = {}
+        self.flush_task = None
+
+    def save(self, deal):
+        # Writes are coalesced per deal and committed by the flush task
+        metrics.track_stage(deal)
+        data = serialize_deal(deal)
+        if self.journal:
+            self.journal.record_stage(deal, data)
+        self.pending[deal['channel_id']] = (
+            deal['stage'],
+            deal.get('deposit_address'),
+            data,
+            time.time()
+        )
+
+    def delete(self, channel_id):
+        metrics.forget_deal(channel_id)
+        if self.journal:
+            self.journal.record_closed(channel_id)
+        self.pending[channel_id] = None
+
+    def forget(self, channel_id):
+        # Drops unflushed writes for a deal that another worker now owns
+        self.pending.pop(channel_id, None)
+
+    def write_batch(self, batch):
+        upserts = [
+            (channel_id, *row) for channel_id, row in batch.items() if row is not None
+        ]
+        deletes = [(channel_id,) for channel_id, row in batch.items() if row is None]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO deals (channel_id, stage, deposit_address, data, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (channel_id) DO UPDATE SET "
+                "stage = excluded.stage, deposit_address = excluded.deposit_address, "
+                "data = excluded.data, updated_at = excluded.updated_at",
+                upserts
+            )
+            self.conn.executemany("DELETE FROM deals WHERE channel_id = ?", deletes)
+
+    def flush(self):
+        if self.pending:
+            batch, self.pending = self.pending, {}
+            self.write_batch(batch)
+
+    async def flush_async(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        try:
+            # One commit per batch, off the event loop
+            with metrics.timer('store flush'):
+                await asyncio.to_thread(self.write_batch, batch)
+        except sqlite3.Error:
+            # Put the batch back unless a newer write for the deal came in
+            for channel_id, row in batch.items():
+                self.pending.setdefault(channel_id, row)
+            raise
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_async()
+            except sqlite3.Error as e:
+                print(f"Deal store flush failed: {e}")
+
+    def start(self):
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.run())
+
+    def commit_now(self, sql, params):
+        # Payout markers skip the batch and are fsynced before returning
+        with self.lock:
+            self.conn.execute("PRAGMA synchronous=FULL")
+            try:
+                with self.conn:
+                    self.conn.execute(sql, params)
+            finally:
+                self.conn.execute("PRAGMA synchronous=NORMAL")
+
+    def payout(self, channel_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT receiver, amount_litoshis, txid FROM payouts WHERE channel_id = ?",
+                (channel_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'receiver': row[0], 'amount_litoshis': row[1], 'txid': row[2]}
+
+    def start_payout(self, channel_id, receiver, amount_litoshis):
+        self.commit_now(
+            "INSERT INTO payouts (channel_id, receiver, amount_litoshis, started_at) "
+            "VALUES (?, ?, ?, ?)",
+            (channel_id, receiver, amount_litoshis, time.time())
+        )
+
+    def finish_payout(self, channel_id, txid):
+        self.commit_now("UPDATE payouts SET txid = ? WHERE channel_id = ?", (txid, channel_id))
+
+    def clear_payout(self, channel_id):
+        self.commit_now("DELETE FROM payouts WHERE channel_id = ?", (channel_id,))
+
+    def query(self, sql, params=()):
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [deserialize_deal(row[0]) for row in rows]
+
+    def get(self, channel_id):
+        deals = self.query("SELECT data FROM deals WHERE channel_id = ?", (channel_id,))
+        return deals[0] if deals else None
+
+    def by_stage(self, stage):
+        return self.query("SELECT data FROM deals WHERE stage = ?", (stage,))
+
+    def by_address(self, address):
+        return self.query("SELECT data FROM deals WHERE deposit_address = ?", (address,))
+
+    def load_all(self):
+        return self.query("SELECT data FROM deals")
+
+    def prune(self, stage):
+        # Drops finished deals left in the table; the journal keeps them
+        with self.lock, self.conn:
+            return self.conn.execute("DELETE FROM deals WHERE stage = ?", (stage,)).rowcount
+
+    async def close(self):
+        if self.flush_task:
+            self.flush_task.cancel()
+            self.flush_task = None
+        self.flush()
+        with self.lock:
+            self.conn.close()
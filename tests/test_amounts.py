@@ -0,0 +1,62 @@
+import pytest
+from amounts import AmountIndex, SharedAmountIndex, format_ltc, to_litoshis
+
+ADDRESS = 'ltc1qshared'
+
+def test_to_litoshis_rounds_like_the_decimal_string():
+    # int(0.29 * 1e8) would be 28999999
+    assert to_litoshis(0.29) == 29_000_000
+    assert to_litoshis('0.12345678') == 12_345_678
+    assert to_litoshis('0.000000005') == 1
+    assert to_litoshis('0.000000004') == 0
+    assert to_litoshis(10 / 3) == 333_333_333
+    assert format_ltc(to_litoshis('1.5')) == '1.50000000'
+
+def test_same_amount_is_nudged_per_deal():
+    index = AmountIndex(max_nudge=1000)
+    litoshis = to_litoshis(10 / 75.0)
+    first = index.allocate(ADDRESS, 1, litoshis)
+    second = index.allocate(ADDRESS, 2, litoshis)
+    assert (first, second) == (litoshis, litoshis + 1)
+    assert index.lookup(ADDRESS, first) == 1
+    assert index.lookup(ADDRESS, second) == 2
+    # Asking again for the same deal returns its existing amount
+    assert index.allocate(ADDRESS, 1, litoshis) == first
+    # Other addresses don't compete for amounts
+    assert index.allocate('ltc1qother', 3, litoshis) == litoshis
+
+def test_allocate_gives_up_after_max_nudge():
+    index = AmountIndex(max_nudge=3)
+    assert [index.allocate(ADDRESS, deal, 5000) for deal in (1, 2, 3)] == [5000, 5001, 5002]
+    with pytest.raises(ValueError):
+        index.allocate(ADDRESS, 4, 5000)
+
+def test_release_frees_only_the_owners_amount():
+    index = AmountIndex()
+    amount = index.allocate(ADDRESS, 1, 5000)
+    index.release(ADDRESS, amount, 2)
+    assert index.lookup(ADDRESS, amount) == 1
+    index.release(ADDRESS, amount, 1)
+    assert index.lookup(ADDRESS, amount) is None
+    assert index.allocate(ADDRESS, 2, 5000) == amount
+
+def test_workers_keep_to_their_residue_class():
+    workers = [AmountIndex(max_nudge=20, stride=3, offset=offset) for offset in range(3)]
+    for offset, index in enumerate(workers):
+        amounts = [index.allocate(ADDRESS, deal, 1000) for deal in range(5)]
+        assert all(amount % 3 == offset for amount in amounts)
+        assert all(1000 <= amount < 1020 for amount in amounts)
+        assert len(set(amounts)) == 5
+    # A class runs out on its own share of the window
+    with pytest.raises(ValueError):
+        for deal in range(5, 10):
+            workers[0].allocate(ADDRESS, deal, 1000)
+
+def test_shared_index_sees_other_workers_claims(tmp_path):
+    path = str(tmp_path / 'deals.db')
+    first = SharedAmountIndex(path)
+    second = SharedAmountIndex(path)
+    assert first.allocate(ADDRESS, 1, 5000) == 5000
+    assert second.allocate(ADDRESS, 2, 5000) == 5001
+    first.release(ADDRESS, 5000, 1)
+    assert second.allocate(ADDRESS, 3, 5000) == 5000
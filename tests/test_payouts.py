@@ -0,0 +1,77 @@
+import asyncio
+from payouts import PayoutQueue
+from wallet import PayoutRejected
+
+class ScriptedWallet:
+    # Stands in for WalletService.send_many; `reject` lists receivers whose
+    # payout fails before broadcast, `fail_after_send` makes every send
+    # fail as if the transaction may already be out
+    def __init__(self, reject=(), fail_after_send=False):
+        self.reject = set(reject)
+        self.fail_after_send = fail_after_send
+        self.sends = []
+
+    async def send_many(self, outputs):
+        self.sends.append(list(outputs))
+        if self.fail_after_send:
+            raise RuntimeError("Broadcast may have failed")
+        if any(receiver in self.reject for receiver, _ in outputs):
+            raise PayoutRejected("Insufficient funds")
+        return f"tx{len(self.sends)}"
+
+async def run_queue(wallet, calls):
+    queue = PayoutQueue(wallet, window=0.05)
+    queue.start()
+    try:
+        results = await asyncio.gather(
+            *(queue.release(*call) for call in calls), return_exceptions=True
+        )
+    finally:
+        queue.stop()
+    return queue, results
+
+def test_duplicate_release_pays_once():
+    wallet = ScriptedWallet()
+    queue, results = asyncio.run(run_queue(wallet, [
+        ('deal', 'addr1', 1000),
+        ('deal', 'addr2', 1000),
+        ('deal', 'addr1', 1000),
+    ]))
+    assert wallet.sends == [[('addr1', 1000)]]
+    assert results == [('tx1', 'addr1')] * 3
+
+def test_rejected_batch_is_paid_one_by_one():
+    wallet = ScriptedWallet(reject={'bad'})
+    queue, results = asyncio.run(run_queue(wallet, [
+        ('a', 'good1', 1000),
+        ('b', 'bad', 2000),
+        ('c', 'good2', 3000),
+    ]))
+    assert wallet.sends[0] == [('good1', 1000), ('bad', 2000), ('good2', 3000)]
+    assert wallet.sends[1:] == [[('good1', 1000)], [('bad', 2000)], [('good2', 3000)]]
+    assert results[0] == ('tx2', 'good1')
+    assert isinstance(results[1], PayoutRejected)
+    assert results[2] == ('tx4', 'good2')
+
+def test_failure_after_broadcast_is_not_retried():
+    async def scenario():
+        wallet = ScriptedWallet(fail_after_send=True)
+        queue, results = await run_queue(wallet, [('a', 'addr1', 1000), ('b', 'addr2', 2000)])
+        # Asking again gets the same failure back instead of a second send
+        queue.start()
+        try:
+            again = await asyncio.gather(queue.release('a', 'addr1', 1000), return_exceptions=True)
+        finally:
+            queue.stop()
+        return wallet, results + again
+
+    wallet, results = asyncio.run(scenario())
+    assert wallet.sends == [[('addr1', 1000), ('addr2', 2000)]]
+    assert all(isinstance(result, RuntimeError) and not isinstance(result, PayoutRejected) for result in results)
+
+def test_forget_drops_the_key():
+    wallet = ScriptedWallet()
+    queue, _ = asyncio.run(run_queue(wallet, [('deal', 'addr1', 1000)]))
+    queue.forget('deal')
+    assert 'deal' not in queue.results
+    assert 'deal' not in queue.locks
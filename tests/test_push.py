@@ -0,0 +1,58 @@
+import asyncio
+import struct
+import time
+import zmq
+import zmq.asyncio
+from bitcoinlib.keys import HDKey
+from bitcoinlib.transactions import Transaction
+from push import ZmqWatcher
+
+def deposit_tx(litoshis):
+    # Unsigned is fine, the watcher only reads outputs
+    key = HDKey(network='litecoin', witness_type='segwit')
+    tx = Transaction(network='litecoin', witness_type='segwit')
+    tx.add_input(prev_txid=b'\x11' * 32, output_n=0, keys=key.public())
+    tx.add_output(litoshis, address=key.address())
+    return key.address(), tx.raw()
+
+async def publish_and_receive():
+    # A scripted stand-in for litecoind's zmqpubrawtx / zmqpubhashblock feed
+    publisher = zmq.asyncio.Context.instance().socket(zmq.PUB)
+    port = publisher.bind_to_random_port('tcp://127.0.0.1')
+    outputs = []
+    blocks = []
+    received = asyncio.Event()
+
+    async def on_output(txid, address, value):
+        outputs.append((txid, address, value, time.perf_counter()))
+        received.set()
+
+    async def on_block(block_hash):
+        blocks.append(block_hash)
+
+    watcher = ZmqWatcher(f"tcp://127.0.0.1:{port}", on_output, on_block)
+    watcher.start()
+    try:
+        # Subscriptions take a moment to reach the publisher
+        await asyncio.sleep(0.3)
+        address, raw = deposit_tx(12_345_678)
+        sent = time.perf_counter()
+        await publisher.send_multipart([b'rawtx', raw, struct.pack('<I', 0)])
+        await asyncio.wait_for(received.wait(), 1)
+        await publisher.send_multipart([b'hashblock', b'\xab' * 32, struct.pack('<I', 0)])
+        for _ in range(100):
+            if blocks:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        watcher.stop()
+        publisher.close(linger=0)
+    return address, raw, sent, outputs, blocks
+
+def test_pushed_output_arrives_within_a_second():
+    address, raw, sent, outputs, blocks = asyncio.run(publish_and_receive())
+    txid, output_address, value, arrived = outputs[0]
+    assert txid == Transaction.parse_bytes(raw, network='litecoin').txid
+    assert (output_address, value) == (address, 12_345_678)
+    assert arrived - sent < 1
+    assert blocks == ['ab' * 32]
@@ -0,0 +1,62 @@
+import asyncio
+import time
+from aiohttp import web
+from sochain import SoChainClient
+
+RESPONSE_DELAY = 0.5
+
+async def start_stub():
+    # Every endpoint answers slowly, like a provider under load
+    async def get_info(request):
+        await asyncio.sleep(RESPONSE_DELAY)
+        return web.json_response({'status': 'success', 'data': {'blocks': 2_500_000}})
+
+    async def get_tx_received(request):
+        await asyncio.sleep(RESPONSE_DELAY)
+        return web.json_response({'status': 'success', 'data': {'txs': [
+            {'txid': 'ab' * 32, 'value': '0.12345678', 'confirmations': 1}
+        ]}})
+
+    app = web.Application()
+    app.router.add_get('/get_info/LTC', get_info)
+    app.router.add_get('/get_tx_received/LTC/{address}', get_tx_received)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}"
+
+async def sample_lag(lags, interval=0.01):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+async def slow_lookups():
+    runner, base_url = await start_stub()
+    client = SoChainClient(base_url, timeout=5, max_concurrency=4)
+    lags = []
+    sampler = asyncio.create_task(sample_lag(lags))
+    start = time.perf_counter()
+    try:
+        height, received = await asyncio.gather(
+            client.get_block_height(),
+            client.get_many_received_txs({f"LTCaddress{i}": None for i in range(8)})
+        )
+    finally:
+        elapsed = time.perf_counter() - start
+        sampler.cancel()
+        await client.close()
+        await runner.cleanup()
+    return height, received, elapsed, lags
+
+def test_loop_stays_responsive_during_slow_lookups():
+    height, received, elapsed, lags = asyncio.run(slow_lookups())
+    assert height == 2_500_000
+    assert all(txs[0]['value'] == '0.12345678' for txs in received.values())
+    # Nine lookups through four connections take three rounds of the delay
+    assert elapsed >= 2 * RESPONSE_DELAY
+    # The loop kept ticking the whole time, never stalled for a response
+    assert len(lags) > elapsed / 0.01 / 2
+    assert max(lags) < 0.1
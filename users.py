@@ -0,0 +1,35 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+class UserCache:
+    def __init__(self, fetch, ttl=600, maxsize=5000):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, user_id):
+        entry = self.entries.get(user_id)
+        if entry and time.monotonic() - entry[1] < self.ttl:
+            self.entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+        # Concurrent lookups of the same user share one fetch
+        self.misses += 1
+        future = self.inflight.get(user_id)
+        if future is None:
+            future = asyncio.ensure_future(self.fetch(user_id))
+            self.inflight[user_id] = future
+            future.add_done_callback(lambda _: self.inflight.pop(user_id, None))
+        user = await asyncio.shield(future)
+
+        self.entries[user_id] = (user, time.monotonic())
+        self.entries.move_to_end(user_id)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return user
@@ -1,7 +1,8 @@
+import os
 import random
 import string
-import requests
-from bitcoinlib.wallets import Wallet
+from functools import lru_cache
+from metrics import metrics
 
 def generate_deal_code():
     chars = string.ascii_uppercase + string.digits
@@ -11,18 +12,48 @@ def get_ltc_address():
     with open('ltcaddy.txt') as f:
         return f.read().strip()
 
+def get_xpub():
+    if not os.path.exists('xpub.txt'):
+        return None
+    with open('xpub.txt') as f:
+        return f.read().strip() or None
+
+@lru_cache(maxsize=4)
+def get_account_key(xpub):
+    # bitcoinlib takes a few hundred ms to import, so it loads on first use
+    from bitcoinlib.keys import HDKey
+    return HDKey(xpub, network='litecoin')
+
+def derive_ltc_address(xpub, index):
+    with metrics.timer('derive address'):
+        return get_account_key(xpub).subkey_for_path(f"0/{index}").address()
+
+@lru_cache(maxsize=4)
+def xpub_matches_key(xpub, key):
+    # Per-deal addresses are only spendable when the wallet key is the
+    # account xprv behind xpub.txt
+    from bitcoinlib.keys import HDKey
+    try:
+        private = HDKey(key, network='litecoin')
+    except Exception:
+        return False
+    account = get_account_key(xpub)
+    return (
+        private.is_private and
+        private.public_byte == account.public_byte and
+        private.chain == account.chain
+    )
+
 def get_wif_key():
     with open('wifkey.txt') as f:
         return f.read().strip()
 
-def send_ltc(receiver, amount, wif_key):
-    wallet = Wallet.import_key("mm_bot", wif_key, network='litecoin')
-    tx = wallet.send_to(receiver, amount, fee=0.0001)
-    return tx.txid
-
-def get_live_rate():
-    response = requests.get("https://api.coingecko.com/api/v3/simple/price?ids=litecoin&vs_currencies=usd")
-    return response.json()["litecoin"]["usd"]
+def get_witness_type(address):
+    if address.startswith('ltc1'):
+        return 'segwit'
+    if address.startswith('M'):
+        return 'p2sh-segwit'
+    return 'legacy'
 
 def validate_ltc_address(address):
     return address.startswith(('L', 'M', 'ltc1')) and 26 <= len(address) <= 48
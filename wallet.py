@@ -0,0 +1,359 @@
+import asyncio
+import math
+import sqlite3
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from fees import DEFAULT_FEE_RATE
+from metrics import metrics
+
+# Virtual bytes per input and per output, used to price a transaction
+# before it is built
+TX_SIZES = {
+    'segwit': (68, 31),
+    'p2sh-segwit': (91, 32),
+    'legacy': (148, 34)
+}
+TX_OVERHEAD = 11
+MAX_CONSOLIDATION_INPUTS = 100
+MAX_SPLIT_OUTPUTS = 10
+
+class PayoutRejected(RuntimeError):
+    # The payout failed before anything reached the network, so it is safe
+    # to try again. Any other send error may have come after relay
+    pass
+
+def estimate_vsize(witness_type, inputs, outputs):
+    input_size, output_size = TX_SIZES.get(witness_type, TX_SIZES['legacy'])
+    return TX_OVERHEAD + inputs * input_size + outputs * output_size
+
+def payout_bucket(litoshis):
+    # Rounds a payout up the 1-2-5 series, e.g. 0.37 LTC to 0.5 LTC
+    magnitude = 10 ** (len(str(max(litoshis, 1))) - 1)
+    for step in (1, 2, 5, 10):
+        if litoshis <= step * magnitude:
+            return step * magnitude
+
+def select_coins(utxos, amount, fee_rate, witness_type, outputs=1):
+    # The smallest single UTXO that covers the payout wins, so pre-split
+    # outputs go before large ones are broken up. Otherwise the largest
+    # UTXOs are combined. Returns the inputs and the fee
+    def fee(inputs):
+        return math.ceil(fee_rate * estimate_vsize(witness_type, inputs, outputs + 1))
+
+    ordered = sorted(utxos, key=lambda utxo: utxo['value'])
+    for utxo in ordered:
+        if utxo['value'] >= amount + fee(1):
+            return [utxo], fee(1)
+    chosen = []
+    total = 0
+    for utxo in reversed(ordered):
+        chosen.append(utxo)
+        total += utxo['value']
+        if total >= amount + fee(len(chosen)):
+            return chosen, fee(len(chosen))
+    raise PayoutRejected("Not enough confirmed funds in the wallet for this payout")
+
+class WalletService:
+    def __init__(self, key_loader, name='mm_bot', network='litecoin', witness_type=None,
+                 fee_rates=None, lock_path=None, dust_threshold=100_000, consolidate_min=10,
+                 max_consolidation_fee_rate=5, reserve=2, quiet_period=300, deposits=None,
+                 on_broadcast=None):
+        self.key_loader = key_loader
+        # Derivation indexes of the deposit addresses open deals still use
+        self.deposits = deposits
+        # Awaited on the event loop with (txid, output addresses) before a
+        # transaction is sent
+        self.on_broadcast = on_broadcast
+        self.loop = None
+        self.lock_path = lock_path
+        self.name = name
+        self.network = network
+        self.witness_type = witness_type
+        self.fee_rates = fee_rates
+        self.dust_threshold = dust_threshold
+        self.consolidate_min = consolidate_min
+        self.max_consolidation_fee_rate = max_consolidation_fee_rate
+        self.reserve = reserve
+        self.quiet_period = quiet_period
+        # bitcoinlib's database session isn't thread safe, so every wallet
+        # call goes through this one worker thread
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='wallet')
+        self.wallet = None
+        self.load_lock = asyncio.Lock()
+        # Unspent outputs by (txid, output_n), kept current between rescans
+        self.utxos = {}
+        self.recent_payouts = deque(maxlen=100)
+        self.last_payout = 0
+
+    async def run(self, func, *args):
+        self.loop = asyncio.get_running_loop()
+        return await self.loop.run_in_executor(self.executor, func, *args)
+
+    def open_wallet(self):
+        # Imported here, on the wallet thread, to keep bitcoinlib and its
+        # database setup out of startup
+        from bitcoinlib.keys import get_key_format
+        from bitcoinlib.wallets import wallet_create_or_open
+
+        key = self.key_loader()
+        # A plain WIF key is a single-address wallet, extended keys are HD
+        scheme = 'bip32' if get_key_format(key)['format'].startswith('hdkey') else 'single'
+        wallet = wallet_create_or_open(
+            self.name,
+            keys=key,
+            network=self.network,
+            scheme=scheme,
+            witness_type=self.witness_type
+        )
+        if scheme == 'bip32' and self.deposits:
+            # In case one was handed out but never registered
+            with self.process_lock():
+                for index in self.deposits():
+                    wallet.key_for_path([0, index])
+        self.update_sync(wallet)
+        return wallet
+
+    @contextmanager
+    def process_lock(self):
+        # Several bot processes share one wallet; an SQLite write lock keeps
+        # them from spending the same UTXOs and is dropped if a process dies
+        if not self.lock_path:
+            yield
+            return
+        conn = sqlite3.connect(self.lock_path, timeout=60, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield
+        finally:
+            conn.close()
+
+    async def load(self):
+        async with self.load_lock:
+            if self.wallet is None:
+                self.wallet = await self.run(self.open_wallet)
+        return self.wallet
+
+    def register_sync(self, index):
+        with self.process_lock():
+            self.wallet.key_for_path([0, index])
+
+    async def register_deposit(self, index):
+        # bitcoinlib only scans keys it holds, so each per-deal deposit
+        # address (0/<index> under the account key) is added to the wallet
+        await self.load()
+        await self.run(self.register_sync, index)
+
+    async def refresh(self):
+        wallet = await self.load()
+        await self.run(self.update_sync, wallet)
+
+    def update_sync(self, wallet):
+        with self.process_lock():
+            self.rescan(wallet)
+
+    def rescan(self, wallet):
+        # Callers hold the process lock. An HD wallet only asks upstream
+        # about keys that matter, so the cost doesn't grow with every deal
+        # ever made
+        with metrics.timer('wallet utxos_update'):
+            if wallet.scheme == 'bip32':
+                for key_id in self.tracked_keys(wallet):
+                    wallet.utxos_update(key_id=key_id)
+            else:
+                wallet.utxos_update(rescan_all=False)
+            self.load_utxos(wallet)
+
+    def tracked_keys(self, wallet):
+        # Open deals' deposit keys, the change key and any key still holding
+        # coins. A settled deposit address drops out once it is swept
+        key_ids = {utxo['key_id'] for utxo in wallet.utxos()}
+        key_ids.add(wallet.get_key(change=1).key_id)
+        for index in self.open_deposits():
+            key_ids.add(wallet.key_for_path([0, index]).key_id)
+        return key_ids
+
+    def open_deposits(self):
+        return set(self.deposits()) if self.deposits else set()
+
+    def load_utxos(self, wallet):
+        # Reads bitcoinlib's local database, no network
+        self.utxos = {(utxo['txid'], utxo['output_n']): utxo for utxo in wallet.utxos()}
+
+    def spendable(self):
+        return [utxo for utxo in list(self.utxos.values()) if utxo['confirmations'] > 0]
+
+    def fee_rate(self):
+        return self.fee_rates.current() if self.fee_rates else DEFAULT_FEE_RATE
+
+    def broadcast(self, outputs, inputs, fee):
+        # Callers hold the process lock. Building and signing never touch
+        # the network; only errors from those steps are PayoutRejected
+        try:
+            tx = self.wallet.transaction_create(
+                outputs,
+                input_arr=[
+                    (utxo['txid'], utxo['output_n'], utxo['key_id'], utxo['value'])
+                    for utxo in inputs
+                ],
+                fee=fee
+            )
+            tx.sign()
+            tx.rawtx = tx.raw()
+            tx.size = len(tx.rawtx)
+            tx.calc_weight_units()
+            tx.txid = tx.signature_hash()[::-1].hex()
+        except Exception as e:
+            raise PayoutRejected(f"Could not build the transaction: {e}") from e
+        # send() skips a transaction that fails verification without relaying it
+        if not tx.verify():
+            raise PayoutRejected(f"Signed transaction {tx.txid} does not verify")
+        if self.on_broadcast:
+            asyncio.run_coroutine_threadsafe(
+                self.on_broadcast(tx.txid, [address for address, _ in outputs]), self.loop
+            ).result()
+        tx.send(broadcast=True)
+        if tx.error:
+            raise RuntimeError(f"Broadcast of {tx.txid} may have failed: {tx.error}")
+        # Spent inputs leave the set now; change shows up on the next rescan
+        for utxo in inputs:
+            self.utxos.pop((utxo['txid'], utxo['output_n']), None)
+        return tx.txid
+
+    def send_sync(self, outputs, fee_rate):
+        # Amounts are integer litoshis, which is how bitcoinlib reads ints.
+        # Inputs are picked from the tracked set and the fee priced from the
+        # cached rate, so nothing here waits on a fee or UTXO lookup
+        amount = sum(value for _, value in outputs)
+        with self.process_lock(), metrics.timer('wallet send'):
+            if self.lock_path:
+                # Another worker may have spent some of our view
+                self.load_utxos(self.wallet)
+            try:
+                inputs, fee = select_coins(
+                    self.spendable(), amount, fee_rate, self.witness_type, len(outputs)
+                )
+            except PayoutRejected:
+                # A deposit that confirmed since the last refresh isn't
+                # tracked yet, rescan once before giving up
+                try:
+                    self.rescan(self.wallet)
+                except Exception as e:
+                    raise PayoutRejected(f"Could not refresh the wallet: {e}") from e
+                inputs, fee = select_coins(
+                    self.spendable(), amount, fee_rate, self.witness_type, len(outputs)
+                )
+            txid = self.broadcast(outputs, inputs, fee)
+        self.recent_payouts.extend(value for _, value in outputs)
+        self.last_payout = time.monotonic()
+        return txid
+
+    async def send(self, receiver, amount):
+        return await self.send_many([(receiver, amount)])
+
+    async def send_many(self, outputs):
+        await self.load()
+        fee_rate = await self.fee_rates.get_rate() if self.fee_rates else self.fee_rate()
+        return await self.run(self.send_sync, outputs, fee_rate)
+
+    def own_address(self):
+        # Only called for HD wallets, where change is its own chain and
+        # never one of the deposit addresses
+        return self.wallet.get_key(change=1).address
+
+    def settled_deposits(self):
+        # Coins still sitting on deposit addresses of deals that are over
+        open_deposits = self.open_deposits()
+        settled = []
+        for utxo in self.spendable():
+            key = self.wallet.key(utxo['key_id'])
+            if key.change == 0 and key.address_index not in open_deposits:
+                settled.append(utxo)
+        return settled
+
+    def sweep_sync(self, settled, fee_rate):
+        total = sum(utxo['value'] for utxo in settled)
+        fee = math.ceil(fee_rate * estimate_vsize(self.witness_type, len(settled), 1))
+        if total - fee < self.dust_threshold:
+            return None
+        txid = self.broadcast([(self.own_address(), total - fee)], settled, fee)
+        print(f"Swept {len(settled)} settled deposit outputs to change ({txid})")
+        return txid
+
+    def consolidate_sync(self, dust, fee_rate):
+        total = sum(utxo['value'] for utxo in dust)
+        fee = math.ceil(fee_rate * estimate_vsize(self.witness_type, len(dust), 1))
+        if total - fee < self.dust_threshold:
+            return None
+        txid = self.broadcast([(self.own_address(), total - fee)], dust, fee)
+        print(f"Consolidated {len(dust)} small UTXOs into one output ({txid})")
+        return txid
+
+    def split_targets(self):
+        # Common payout sizes, rounded up, and how many more UTXOs of each
+        # size are needed to keep `reserve` of them ready
+        held = Counter(utxo['value'] for utxo in list(self.utxos.values()))
+        buckets = Counter(payout_bucket(amount) for amount in self.recent_payouts)
+        outputs = []
+        for bucket, _ in buckets.most_common(3):
+            outputs += [bucket] * max(self.reserve - held[bucket], 0)
+        return outputs[:MAX_SPLIT_OUTPUTS]
+
+    def split_sync(self, fee_rate):
+        targets = self.split_targets()
+        if not targets:
+            return None
+        address = self.own_address()
+        try:
+            inputs, fee = select_coins(self.spendable(), sum(targets), fee_rate,
+                                       self.witness_type, len(targets))
+        except RuntimeError:
+            return None
+        txid = self.broadcast([(address, value) for value in targets], inputs, fee)
+        print(f"Split {len(targets)} outputs for common payout sizes ({txid})")
+        return txid
+
+    def maintain_sync(self, fee_rate):
+        # At most one transaction per run, so a payout queued behind it on
+        # the wallet thread waits for one signature at most
+        with self.process_lock(), metrics.timer('wallet maintenance'):
+            self.load_utxos(self.wallet)
+            settled = self.settled_deposits()
+            if settled and fee_rate <= self.max_consolidation_fee_rate:
+                txid = self.sweep_sync(settled[:MAX_CONSOLIDATION_INPUTS], fee_rate)
+                if txid:
+                    return txid
+            dust = sorted(
+                (utxo for utxo in self.spendable() if utxo['value'] < self.dust_threshold),
+                key=lambda utxo: utxo['value'],
+                reverse=True
+            )
+            if len(dust) >= self.consolidate_min and fee_rate <= self.max_consolidation_fee_rate:
+                return self.consolidate_sync(dust[:MAX_CONSOLIDATION_INPUTS], fee_rate)
+            return self.split_sync(fee_rate)
+
+    async def maintain(self):
+        # Consolidates dust and pre-splits outputs once payouts have been
+        # quiet for a while. A single-key wallet's change is the deposit
+        # address, where a round-valued output could match a deal, so it
+        # is left alone
+        if time.monotonic() - self.last_payout < self.quiet_period:
+            return None
+        await self.load()
+        if self.wallet.scheme != 'bip32':
+            return None
+        fee_rate = await self.fee_rates.get_rate() if self.fee_rates else self.fee_rate()
+        return await self.run(self.maintain_sync, fee_rate)
+
+    def status(self):
+        spendable = self.spendable()
+        return {
+            'utxos': len(self.utxos),
+            'spendable': len(spendable),
+            'dust': sum(utxo['value'] < self.dust_threshold for utxo in spendable),
+            'fee_rate': self.fee_rate()
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=False)